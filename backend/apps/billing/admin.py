@@ -1,11 +1,11 @@
 """
 Billing Admin Configuration
-Django admin for Invoice and IdempotencyRecord models
+Django admin for Invoice, IdempotencyRecord and billing summary models
 """
 from django.contrib import admin
 from django.utils.html import format_html
 
-from .models import IdempotencyRecord, Invoice
+from .models import IdempotencyRecord, Invoice, OrganizationBillingSummary
 
 
 @admin.register(IdempotencyRecord)
@@ -75,7 +75,7 @@ class InvoiceAdmin(admin.ModelAdmin):
             'description': 'SR=Standard-Rated (9%), ZR=Zero-Rated, OS=Out-of-Scope, TX=Exempted'
         }),
         ('Payment', {
-            'fields': ('status', 'amount_paid_cents', 'paid', 'due_date', 'paid_at')
+            'fields': ('status', 'amount_paid_cents', 'paid', 'due_date', 'paid_at', 'last_reminder_sent_at')
         }),
         ('Stripe', {
             'fields': ('stripe_invoice_id', 'stripe_payment_intent_id'),
@@ -126,3 +126,26 @@ class InvoiceAdmin(admin.ModelAdmin):
             obj.get_status_display()
         )
     status_badge.short_description = 'Status'
+    
+    def has_delete_permission(self, request, obj=None):
+        # Issued invoices are tax documents (and counted in the billing
+        # summary); void them instead
+        return False
+
+
+@admin.register(OrganizationBillingSummary)
+class OrganizationBillingSummaryAdmin(admin.ModelAdmin):
+    """Read-only admin for OrganizationBillingSummary (maintained by invoice writes)."""
+    
+    list_display = [
+        'organization', 'invoice_count', 'open_invoice_count',
+        'outstanding_cents', 'overdue_count', 'lifetime_paid_cents', 'updated_at',
+    ]
+    search_fields = ['organization__name']
+    list_select_related = ['organization']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
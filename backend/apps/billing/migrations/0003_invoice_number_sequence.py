@@ -0,0 +1,55 @@
+# Generated by Django 6.0 on 2026-10-18 03:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0002_invoice"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InvoiceNumberSequence",
+            fields=[
+                (
+                    "period",
+                    models.CharField(
+                        help_text="Billing period in YYYYMM format",
+                        max_length=6,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "last_value",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Highest invoice number reserved for this period",
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Invoice Number Sequence",
+                "verbose_name_plural": "Invoice Number Sequences",
+                "db_table": "invoice_number_sequences",
+                "ordering": ["-period"],
+            },
+        ),
+        # Seed counters from invoices numbered by the previous MAX() scan
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO invoice_number_sequences (period, last_value, updated_at)
+                SELECT substring(invoice_number FROM 5 FOR 6),
+                       MAX(split_part(invoice_number, '-', 3)::integer),
+                       NOW()
+                FROM invoices
+                WHERE invoice_number ~ '^INV-[0-9]{6}-[0-9]+$'
+                GROUP BY 1
+                ON CONFLICT (period) DO NOTHING
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0003_invoice_number_sequence"),
+        ("organizations", "0001_initial"),
+        ("subscriptions", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(
+                fields=["organization", "-created_at", "-id"],
+                name="invoices_org_created_id_idx",
+            ),
+        ),
+    ]
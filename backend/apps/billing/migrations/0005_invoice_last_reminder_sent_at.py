@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0004_invoice_org_created_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invoice",
+            name="last_reminder_sent_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the last overdue reminder was sent",
+                null=True,
+            ),
+        ),
+    ]
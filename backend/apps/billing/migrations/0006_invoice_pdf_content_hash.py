@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0005_invoice_last_reminder_sent_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invoice",
+            name="pdf_content_hash",
+            field=models.CharField(
+                blank=True,
+                help_text="SHA-256 of the content rendered into the current PDF",
+                max_length=64,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="invoice",
+            name="pdf_url",
+            field=models.URLField(
+                blank=True, help_text="URL to invoice PDF", max_length=2048
+            ),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 6.0 on 2026-10-18 04:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0006_invoice_pdf_content_hash"),
+        ("organizations", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrganizationBillingSummary",
+            fields=[
+                (
+                    "organization",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="billing_summary",
+                        serialize=False,
+                        to="organizations.organization",
+                    ),
+                ),
+                (
+                    "invoice_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Total number of invoices"
+                    ),
+                ),
+                (
+                    "open_invoice_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Open, unpaid invoices"
+                    ),
+                ),
+                (
+                    "outstanding_cents",
+                    models.BigIntegerField(
+                        default=0, help_text="Amount due across open invoices in cents"
+                    ),
+                ),
+                (
+                    "lifetime_paid_cents",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="Total amount paid across all invoices in cents",
+                    ),
+                ),
+                (
+                    "overdue_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Open invoices past their due date"
+                    ),
+                ),
+                (
+                    "overdue_cents",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="Amount due across overdue invoices in cents",
+                    ),
+                ),
+                (
+                    "overdue_as_of",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="When overdue totals were last recomputed",
+                        null=True,
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Organization Billing Summary",
+                "verbose_name_plural": "Organization Billing Summaries",
+                "db_table": "organization_billing_summaries",
+            },
+        ),
+        # Build summaries for existing invoices
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO organization_billing_summaries (
+                    organization_id, invoice_count, open_invoice_count,
+                    outstanding_cents, lifetime_paid_cents,
+                    overdue_count, overdue_cents, overdue_as_of, updated_at
+                )
+                SELECT organization_id,
+                       COUNT(*),
+                       COUNT(*) FILTER (WHERE status = 'open' AND NOT paid),
+                       COALESCE(SUM(GREATEST(total_amount_cents - amount_paid_cents, 0))
+                           FILTER (WHERE status = 'open' AND NOT paid), 0),
+                       COALESCE(SUM(amount_paid_cents), 0),
+                       COUNT(*) FILTER (WHERE status = 'open' AND NOT paid AND due_date < NOW()),
+                       COALESCE(SUM(GREATEST(total_amount_cents - amount_paid_cents, 0))
+                           FILTER (WHERE status = 'open' AND NOT paid AND due_date < NOW()), 0),
+                       NOW(),
+                       NOW()
+                FROM invoices
+                GROUP BY organization_id
+                ON CONFLICT (organization_id) DO NOTHING
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 04:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0007_organization_billing_summary"),
+        ("organizations", "0001_initial"),
+        ("subscriptions", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(fields=["created_at"], name="invoices_created_at_idx"),
+        ),
+    ]
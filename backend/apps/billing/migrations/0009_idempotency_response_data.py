@@ -0,0 +1,63 @@
+# Generated by Django 6.0 on 2026-10-18 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0008_invoice_created_at_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="idempotencyrecord",
+            name="response_content_type",
+            field=models.CharField(
+                blank=True,
+                help_text="Content type of the stored response",
+                max_length=100,
+            ),
+        ),
+        migrations.AddField(
+            model_name="idempotencyrecord",
+            name="response_data",
+            field=models.BinaryField(
+                blank=True,
+                help_text="Rendered response body for replay, encoded per response_encoding",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="idempotencyrecord",
+            name="response_encoding",
+            field=models.CharField(
+                choices=[
+                    ("identity", "Uncompressed"),
+                    ("gzip", "gzip"),
+                    ("zstd", "Zstandard"),
+                ],
+                default="identity",
+                help_text="Compression applied to response_data",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="idempotencyrecord",
+            name="response_location",
+            field=models.CharField(
+                blank=True,
+                help_text="URL replays redirect to when the response was too large to store",
+                max_length=2048,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="idempotencyrecord",
+            name="response_body",
+            field=models.JSONField(
+                blank=True,
+                help_text="Cached response body (records stored before response_data)",
+                null=True,
+            ),
+        ),
+    ]
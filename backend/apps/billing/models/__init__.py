@@ -3,6 +3,8 @@ Billing Models Package
 """
 from .idempotency import IdempotencyRecord
 from .invoice import Invoice
+from .sequence import InvoiceNumberSequence
+from .summary import OrganizationBillingSummary
 
-__all__ = ['IdempotencyRecord', 'Invoice']
+__all__ = ['IdempotencyRecord', 'Invoice', 'InvoiceNumberSequence', 'OrganizationBillingSummary']
 
@@ -26,6 +26,12 @@ class IdempotencyRecord(models.Model):
         ('failed', 'Failed'),
     ]
     
+    ENCODING_CHOICES = [
+        ('identity', 'Uncompressed'),
+        ('gzip', 'gzip'),
+        ('zstd', 'Zstandard'),
+    ]
+    
     # Primary key
     id = models.UUIDField(
         primary_key=True,
@@ -71,7 +77,28 @@ class IdempotencyRecord(models.Model):
     response_body = models.JSONField(
         null=True,
         blank=True,
-        help_text='Cached response body for replay'
+        help_text='Cached response body (records stored before response_data)'
+    )
+    response_data = models.BinaryField(
+        null=True,
+        blank=True,
+        help_text='Rendered response body for replay, encoded per response_encoding'
+    )
+    response_encoding = models.CharField(
+        max_length=10,
+        choices=ENCODING_CHOICES,
+        default='identity',
+        help_text='Compression applied to response_data'
+    )
+    response_content_type = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text='Content type of the stored response'
+    )
+    response_location = models.CharField(
+        max_length=2048,
+        blank=True,
+        help_text='URL replays redirect to when the response was too large to store'
     )
     
     # Timestamps
@@ -108,6 +135,102 @@ class IdempotencyRecord(models.Model):
         )
     
     @classmethod
-    def cleanup_expired(cls):
-        """Delete expired idempotency records."""
-        return cls.objects.filter(expires_at__lt=timezone.now()).delete()
+    def claim(cls, key: str, request_path: str, request_method: str, request_hash: str, expires_at):
+        """
+        Atomically claim an idempotency key in one statement.
+        
+        INSERT ... ON CONFLICT (key) DO UPDATE takes the key when it is new,
+        failed or expired; otherwise the existing row is returned unchanged,
+        so a replay is served from the same round trip. Concurrent claims
+        serialize on the key's unique index and exactly one of them wins.
+        
+        Returns:
+            tuple: (record, claimed) - claimed is True if this call owns the key
+        """
+        table = cls._meta.db_table
+        claim_id = uuid.uuid4()
+        reclaimable = f"{table}.status = 'failed' OR {table}.expires_at < NOW()"
+        record = list(cls.objects.raw(
+            f"""
+            INSERT INTO {table} (
+                id, key, request_path, request_method, request_hash,
+                status, response_encoding, response_content_type,
+                response_location, created_at, updated_at, expires_at
+            )
+            VALUES (%s, %s, %s, %s, %s, 'processing', 'identity', '', '', NOW(), NOW(), %s)
+            ON CONFLICT (key) DO UPDATE SET
+                id = CASE WHEN {reclaimable} THEN EXCLUDED.id ELSE {table}.id END,
+                request_path = CASE WHEN {reclaimable}
+                    THEN EXCLUDED.request_path ELSE {table}.request_path END,
+                request_method = CASE WHEN {reclaimable}
+                    THEN EXCLUDED.request_method ELSE {table}.request_method END,
+                request_hash = CASE WHEN {reclaimable}
+                    THEN EXCLUDED.request_hash ELSE {table}.request_hash END,
+                response_status_code = CASE WHEN {reclaimable}
+                    THEN NULL ELSE {table}.response_status_code END,
+                response_body = CASE WHEN {reclaimable}
+                    THEN NULL ELSE {table}.response_body END,
+                response_data = CASE WHEN {reclaimable}
+                    THEN NULL ELSE {table}.response_data END,
+                response_encoding = CASE WHEN {reclaimable}
+                    THEN 'identity' ELSE {table}.response_encoding END,
+                response_content_type = CASE WHEN {reclaimable}
+                    THEN '' ELSE {table}.response_content_type END,
+                response_location = CASE WHEN {reclaimable}
+                    THEN '' ELSE {table}.response_location END,
+                expires_at = CASE WHEN {reclaimable}
+                    THEN EXCLUDED.expires_at ELSE {table}.expires_at END,
+                updated_at = CASE WHEN {reclaimable}
+                    THEN NOW() ELSE {table}.updated_at END,
+                status = CASE WHEN {reclaimable}
+                    THEN 'processing' ELSE {table}.status END
+            RETURNING *
+            """,
+            [claim_id, key, request_path, request_method, request_hash, expires_at],
+        ))[0]
+        return record, record.id == claim_id
+    
+    @classmethod
+    def cleanup_expired(cls, batch_size: int = 5000, max_batches: int = None) -> int:
+        """
+        Delete expired idempotency records in bounded batches.
+        
+        Each batch is its own short statement that walks the expires_at
+        index (ORDER BY expires_at LIMIT n), so locks are held briefly and
+        WAL is written in small increments no matter how many rows expired.
+        Rows locked by a concurrent claim are skipped, not waited on.
+        
+        Args:
+            batch_size: Rows deleted per statement
+            max_batches: Stop after this many batches (None = until done)
+            
+        Returns:
+            int: Number of records deleted
+        """
+        from django.db import connection
+        
+        table = cls._meta.db_table
+        now = timezone.now()
+        deleted = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    DELETE FROM {table}
+                    WHERE id IN (
+                        SELECT id FROM {table}
+                        WHERE expires_at < %s
+                        ORDER BY expires_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    """,
+                    [now, batch_size],
+                )
+                count = cursor.rowcount
+            deleted += count
+            batches += 1
+            if count < batch_size:
+                break
+        return deleted
@@ -4,7 +4,7 @@ GST-compliant invoicing with database-level calculation
 """
 import uuid
 from decimal import Decimal
-from django.db import models
+from django.db import models, transaction
 from django.db.models import F
 from django.db.models.functions import Round
 from django.utils import timezone
@@ -127,6 +127,11 @@ class Invoice(models.Model):
         blank=True,
         help_text='When invoice was fully paid'
     )
+    last_reminder_sent_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='When the last overdue reminder was sent'
+    )
     
     # Stripe integration
     stripe_invoice_id = models.CharField(
@@ -142,9 +147,15 @@ class Invoice(models.Model):
     
     # Data
     pdf_url = models.URLField(
+        max_length=2048,
         blank=True,
         help_text='URL to invoice PDF'
     )
+    pdf_content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text='SHA-256 of the content rendered into the current PDF'
+    )
     line_items = models.JSONField(
         default=list,
         blank=True,
@@ -179,6 +190,13 @@ class Invoice(models.Model):
         ]
         indexes = [
             models.Index(fields=['organization', 'status']),
+            # Keyset pagination of an organization's invoices
+            models.Index(
+                fields=['organization', '-created_at', '-id'],
+                name='invoices_org_created_id_idx'
+            ),
+            # Quarterly GST reporting scans by issue date
+            models.Index(fields=['created_at'], name='invoices_created_at_idx'),
             models.Index(fields=['due_date']),
             models.Index(fields=['stripe_invoice_id']),
         ]
@@ -186,31 +204,96 @@ class Invoice(models.Model):
     def __str__(self):
         return f"Invoice {self.invoice_number or self.id} - {self.organization.name}"
     
+    # Fields that change an invoice's contribution to OrganizationBillingSummary
+    SUMMARY_FIELDS = frozenset({'status', 'paid', 'amount_paid_cents', 'subtotal_cents', 'gst_rate'})
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this invoice contributes to the billing summary as
+        # loaded, so save() can apply just the difference
+        if not cls.SUMMARY_FIELDS.union({'total_amount_cents'}) & instance.get_deferred_fields():
+            instance._billing_snapshot = instance.billing_contribution()
+        return instance
+    
     def save(self, *args, **kwargs):
-        """Auto-generate invoice number if not provided."""
-        if not self.invoice_number:
-            # Format: INV-YYYYMM-XXXX
-            from django.db.models import Max
-            year_month = timezone.now().strftime('%Y%m')
-            prefix = f"INV-{year_month}-"
-            
-            # Get the highest existing number for this month
-            last_invoice = Invoice.objects.filter(
-                invoice_number__startswith=prefix
-            ).aggregate(Max('invoice_number'))['invoice_number__max']
-            
-            if last_invoice:
-                try:
-                    last_num = int(last_invoice.split('-')[-1])
-                    new_num = last_num + 1
-                except ValueError:
-                    new_num = 1
-            else:
-                new_num = 1
-            
-            self.invoice_number = f"{prefix}{new_num:04d}"
+        """Auto-generate invoice number if not provided and update the billing summary."""
+        allocate = not self.invoice_number
+        update_fields = kwargs.get('update_fields')
+        track_summary = update_fields is None or not self.SUMMARY_FIELDS.isdisjoint(update_fields)
         
-        super().save(*args, **kwargs)
+        try:
+            # Invoice row and summary are written atomically; a failed insert
+            # also releases the allocated number.
+            with transaction.atomic():
+                if allocate:
+                    # Format: INV-YYYYMM-XXXX, allocated from the per-month sequence.
+                    from .sequence import invoice_number_allocator
+                    self.invoice_number = invoice_number_allocator.allocate()[0]
+                adding = self._state.adding
+                previous = None
+                if track_summary and not adding:
+                    # The delta must be taken against the row as committed,
+                    # not as this instance loaded it: a concurrent payment may
+                    # have been applied since.
+                    previous = self.locked_contribution()
+                super().save(*args, **kwargs)
+                if track_summary and (adding or previous is not None):
+                    self.apply_billing_summary(previous)
+        except Exception:
+            if allocate:
+                self.invoice_number = ''
+            raise
+    
+    def billing_contribution(self) -> dict:
+        """What this invoice adds to its organization's billing summary."""
+        outstanding = self.status == 'open' and not self.paid
+        return {
+            'invoice_count': 1,
+            'open_invoice_count': int(outstanding),
+            'outstanding_cents': self.amount_due_cents if outstanding else 0,
+            'lifetime_paid_cents': self.amount_paid_cents,
+        }
+    
+    def locked_contribution(self):
+        """
+        Lock this invoice's row (SELECT ... FOR UPDATE) and return its
+        stored billing contribution, or None if the row does not exist.
+        
+        Call inside the transaction that changes the invoice.
+        """
+        row = type(self).objects.select_for_update().filter(pk=self.pk).only(
+            'status', 'paid', 'amount_paid_cents', 'total_amount_cents'
+        ).first()
+        return row.billing_contribution() if row is not None else None
+    
+    def apply_billing_summary(self, previous: dict = None) -> None:
+        """
+        Apply the change in this invoice's contribution to the summary.
+        
+        save() calls this itself, with the contribution read from the locked
+        row; call it after writes that bypass save() (e.g. bulk_update) on
+        rows loaded with select_for_update(). Defaults to the contribution
+        as last loaded or saved.
+        """
+        from .summary import OrganizationBillingSummary
+        
+        current = self.billing_contribution()
+        if previous is None:
+            previous = getattr(self, '_billing_snapshot', None)
+        previous = previous or dict.fromkeys(current, 0)
+        self._billing_snapshot = current
+        if current == previous:
+            return
+        
+        # An open invoice that is no longer open stops counting as overdue
+        settled = previous['open_invoice_count'] and not current['open_invoice_count']
+        OrganizationBillingSummary.apply(
+            self.organization_id,
+            settled_overdue_since=max(self.due_date, self.created_at) if settled else None,
+            settled_overdue_cents=previous['outstanding_cents'] if settled else 0,
+            **{key: current[key] - previous[key] for key in current},
+        )
     
     @property
     def is_overdue(self) -> bool:
@@ -254,14 +337,22 @@ class Invoice(models.Model):
         return Decimal(self.total_amount_cents) / 100
     
     def mark_paid(self, payment_intent_id: str = None) -> None:
-        """Mark invoice as paid."""
+        """
+        Mark invoice as paid.
+        
+        The paid amount is copied from the stored total inside the UPDATE
+        itself and read back via RETURNING, so a stale in-memory total can
+        never be written and no extra SELECT is needed.
+        """
         self.status = 'paid'
         self.paid = True
         self.paid_at = timezone.now()
-        self.amount_paid_cents = self.total_amount_cents or 0
+        self.amount_paid_cents = F('total_amount_cents')
+        update_fields = ['status', 'paid', 'paid_at', 'amount_paid_cents', 'updated_at']
         if payment_intent_id:
             self.stripe_payment_intent_id = payment_intent_id
-        self.save()
+            update_fields.append('stripe_payment_intent_id')
+        self.save(update_fields=update_fields)
     
     def void(self) -> None:
         """Void the invoice."""
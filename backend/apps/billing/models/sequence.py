@@ -0,0 +1,166 @@
+"""
+Invoice Number Sequence Model
+Per-month counter for contention-free INV-YYYYMM-XXXX allocation
+"""
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from django.utils import timezone
+
+# DATABASES alias used for block reservations (see InvoiceNumberAllocator)
+RESERVATION_DB_ALIAS = 'sequences'
+
+
+class InvoiceNumberSequence(models.Model):
+    """
+    Monotonic invoice number counter, one row per billing month.
+    
+    Numbers are reserved with a single INSERT ... ON CONFLICT DO UPDATE
+    RETURNING statement, so allocation is O(1) regardless of how many
+    invoices exist and concurrent workers can never receive the same number.
+    """
+    
+    # Billing period (YYYYMM) - one counter per month
+    period = models.CharField(
+        max_length=6,
+        primary_key=True,
+        help_text='Billing period in YYYYMM format'
+    )
+    last_value = models.PositiveIntegerField(
+        default=0,
+        help_text='Highest invoice number reserved for this period'
+    )
+    
+    # Timestamps
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'invoice_number_sequences'
+        verbose_name = 'Invoice Number Sequence'
+        verbose_name_plural = 'Invoice Number Sequences'
+        ordering = ['-period']
+    
+    def __str__(self):
+        return f"INV-{self.period}: {self.last_value}"
+    
+    @classmethod
+    def reserve(cls, period: str, count: int = 1, connection=None) -> range:
+        """
+        Atomically reserve `count` consecutive numbers for a period.
+        
+        By default this runs in the caller's transaction: the counter row
+        stays locked until commit, and a rollback releases the numbers again
+        (gapless allocation).
+        
+        Returns:
+            range: The reserved invoice numbers
+        """
+        table = cls._meta.db_table
+        if connection is None:
+            connection = connections[DEFAULT_DB_ALIAS]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (period, last_value, updated_at)
+                VALUES (%s, %s, NOW())
+                ON CONFLICT (period) DO UPDATE
+                    SET last_value = {table}.last_value + EXCLUDED.last_value,
+                        updated_at = NOW()
+                RETURNING last_value
+                """,
+                [period, count],
+            )
+            last_value = cursor.fetchone()[0]
+        return range(last_value - count + 1, last_value + 1)
+
+
+class InvoiceNumberAllocator:
+    """
+    Hands out invoice numbers from InvoiceNumberSequence.
+    
+    With INVOICE_NUMBER_BLOCK_SIZE = 1 (default) every number is reserved
+    inside the invoice's own transaction, so numbering is gapless.
+    
+    With a larger block size each worker process reserves a block of numbers
+    on a dedicated autocommit connection (the 'sequences' database alias)
+    and serves from it locally. The
+    counter row is touched once per block instead of once per invoice, at
+    the cost of gaps: numbers left in a block when the process exits, or
+    used by a rolled-back invoice, are never reissued.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks = {}  # period -> [next_value, last_value]
+    
+    @property
+    def block_size(self) -> int:
+        return max(1, getattr(settings, 'INVOICE_NUMBER_BLOCK_SIZE', 1))
+    
+    def allocate(self, count: int = 1, period: str = None) -> list[str]:
+        """
+        Allocate `count` formatted invoice numbers for a period.
+        
+        Args:
+            count: How many numbers to allocate
+            period: Billing period (YYYYMM), defaults to the current month
+        
+        Returns:
+            list: Invoice numbers in ascending order
+        """
+        period = period or timezone.now().strftime('%Y%m')
+        
+        if self.block_size == 1:
+            numbers = list(InvoiceNumberSequence.reserve(period, count))
+        else:
+            numbers = self._allocate_from_block(period, count)
+        
+        return [self.format(period, number) for number in numbers]
+    
+    @staticmethod
+    def format(period: str, number: int) -> str:
+        """Format as INV-YYYYMM-XXXX."""
+        return f"INV-{period}-{number:04d}"
+    
+    def _allocate_from_block(self, period: str, count: int) -> list[int]:
+        with self._lock:
+            # Drop blocks from previous months
+            for stale in [p for p in self._blocks if p != period]:
+                del self._blocks[stale]
+            
+            numbers = []
+            block = self._blocks.get(period)
+            if block:
+                take = min(count, block[1] - block[0] + 1)
+                numbers.extend(range(block[0], block[0] + take))
+                block[0] += take
+            
+            remaining = count - len(numbers)
+            if remaining:
+                reserved = InvoiceNumberSequence.reserve(
+                    period,
+                    max(self.block_size, remaining),
+                    connection=self._reservation_connection(),
+                )
+                numbers.extend(reserved[:remaining])
+                self._blocks[period] = [reserved.start + remaining, reserved.stop - 1]
+            
+            return numbers
+    
+    @staticmethod
+    def _reservation_connection():
+        """
+        Autocommit connection for block reservations (the 'sequences' alias).
+        
+        Using a separate connection commits the block immediately, so the
+        counter row is never held for the length of a billing transaction
+        and a rollback can never hand the same block to another worker.
+        Being a DATABASES alias, it is per thread and closed by Django's
+        request_finished / Celery task hooks, honouring CONN_MAX_AGE and
+        health checks.
+        """
+        return connections[RESERVATION_DB_ALIAS]
+
+
+invoice_number_allocator = InvoiceNumberAllocator()
@@ -0,0 +1,166 @@
+"""
+Organization Billing Summary Model
+Per-organization invoice totals maintained alongside invoice writes
+"""
+from django.db import connection, models
+
+
+class OrganizationBillingSummary(models.Model):
+    """
+    Running billing totals for one organization.
+    
+    Invoice counts, outstanding balance and lifetime paid are adjusted in
+    the same transaction as every invoice create, payment, void or status
+    change, so dashboards read a single row instead of aggregating the
+    invoices table.
+    
+    Overdue totals depend on the clock and are recomputed by the overdue
+    sweep (check_overdue_invoices); between sweeps, invoices that were
+    counted as overdue are removed again as soon as they are settled.
+    """
+    
+    organization = models.OneToOneField(
+        'organizations.Organization',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='billing_summary'
+    )
+    
+    # Maintained on every invoice write
+    invoice_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Total number of invoices'
+    )
+    open_invoice_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Open, unpaid invoices'
+    )
+    outstanding_cents = models.BigIntegerField(
+        default=0,
+        help_text='Amount due across open invoices in cents'
+    )
+    lifetime_paid_cents = models.BigIntegerField(
+        default=0,
+        help_text='Total amount paid across all invoices in cents'
+    )
+    
+    # Refreshed by the overdue sweep
+    overdue_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Open invoices past their due date'
+    )
+    overdue_cents = models.BigIntegerField(
+        default=0,
+        help_text='Amount due across overdue invoices in cents'
+    )
+    overdue_as_of = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='When overdue totals were last recomputed'
+    )
+    
+    # Timestamps
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'organization_billing_summaries'
+        verbose_name = 'Organization Billing Summary'
+        verbose_name_plural = 'Organization Billing Summaries'
+    
+    def __str__(self):
+        return f"Billing summary for {self.organization_id}"
+    
+    @classmethod
+    def apply(
+        cls,
+        organization_id,
+        invoice_count: int = 0,
+        open_invoice_count: int = 0,
+        outstanding_cents: int = 0,
+        lifetime_paid_cents: int = 0,
+        settled_overdue_since=None,
+        settled_overdue_cents: int = 0,
+    ) -> None:
+        """
+        Add deltas to an organization's summary in one upsert.
+        
+        Increments are applied in SQL (col = col + delta), so concurrent
+        invoice writes never overwrite each other. Call inside the
+        transaction that changes the invoices.
+        
+        Args:
+            organization_id: Organization to update
+            invoice_count: Change in invoice count
+            open_invoice_count: Change in open invoice count
+            outstanding_cents: Change in outstanding balance
+            lifetime_paid_cents: Change in lifetime paid
+            settled_overdue_since: For an invoice leaving the open state,
+                the later of its due date and creation time; if the last
+                overdue sweep ran after that, it was counted as overdue
+            settled_overdue_cents: Amount to remove from overdue_cents
+        """
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (
+                    organization_id, invoice_count, open_invoice_count,
+                    outstanding_cents, lifetime_paid_cents,
+                    overdue_count, overdue_cents, updated_at
+                )
+                VALUES (%s, GREATEST(%s, 0), GREATEST(%s, 0), %s, %s, 0, 0, NOW())
+                ON CONFLICT (organization_id) DO UPDATE SET
+                    invoice_count = GREATEST({table}.invoice_count + %s, 0),
+                    open_invoice_count = GREATEST({table}.open_invoice_count + %s, 0),
+                    outstanding_cents = {table}.outstanding_cents + EXCLUDED.outstanding_cents,
+                    lifetime_paid_cents = {table}.lifetime_paid_cents + EXCLUDED.lifetime_paid_cents,
+                    overdue_count = CASE WHEN {table}.overdue_as_of > %s
+                        THEN GREATEST({table}.overdue_count - 1, 0)
+                        ELSE {table}.overdue_count END,
+                    overdue_cents = CASE WHEN {table}.overdue_as_of > %s
+                        THEN GREATEST({table}.overdue_cents - %s, 0)
+                        ELSE {table}.overdue_cents END,
+                    updated_at = NOW()
+                """,
+                [
+                    organization_id, invoice_count, open_invoice_count,
+                    outstanding_cents, lifetime_paid_cents,
+                    invoice_count, open_invoice_count,
+                    settled_overdue_since, settled_overdue_since, settled_overdue_cents,
+                ],
+            )
+    
+    @classmethod
+    def refresh_overdue(cls, now) -> int:
+        """
+        Recompute overdue totals for every organization in one statement.
+        
+        Args:
+            now: Cut-off; open invoices due before this are overdue
+        
+        Returns:
+            int: Number of summaries updated
+        """
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} AS s
+                SET overdue_count = COALESCE(o.overdue_count, 0),
+                    overdue_cents = COALESCE(o.overdue_cents, 0),
+                    overdue_as_of = %s,
+                    updated_at = NOW()
+                FROM {table} AS base
+                LEFT JOIN (
+                    SELECT organization_id,
+                           COUNT(*) AS overdue_count,
+                           SUM(GREATEST(total_amount_cents - amount_paid_cents, 0)) AS overdue_cents
+                    FROM invoices
+                    WHERE status = 'open' AND NOT paid AND due_date < %s
+                    GROUP BY organization_id
+                ) AS o ON o.organization_id = base.organization_id
+                WHERE s.organization_id = base.organization_id
+                """,
+                [now, now],
+            )
+            return cursor.rowcount
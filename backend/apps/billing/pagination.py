@@ -0,0 +1,147 @@
+"""
+Billing Pagination
+Page-number and keyset pagination for invoice lists
+"""
+import uuid
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class InvoiceCursorPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination on (created_at, id).
+    
+    The cursor carries the (created_at, id) of the row the page starts
+    after, and each page is fetched with a tuple comparison against it:
+    a range scan on the (organization, created_at, id) index with no
+    COUNT and no OFFSET, so deep pages cost the same as page one.
+    
+    DRF's CursorPagination is only reused for its response format and
+    page-size handling. Its own cursor holds ordering[0] plus an offset
+    to step over ties, which degrades to an OFFSET scan when many
+    invoices share a created_at (bulk billing runs).
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        
+        self.base_url = request.build_absolute_uri()
+        self.request = request
+        self.cursor = self.decode_cursor(request)
+        
+        if self.cursor is None:
+            reverse, position = False, None
+        else:
+            reverse, position = self.cursor
+        
+        if reverse:
+            # Previous page: walk up from the cursor and flip the rows back
+            queryset = queryset.order_by('created_at', 'id')
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        
+        if position is not None:
+            created_at, pk = position
+            if reverse:
+                keyset = Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            else:
+                keyset = Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            queryset = queryset.filter(keyset)
+        
+        results = list(queryset[:self.page_size + 1])
+        has_following = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = position is not None
+        
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        
+        return self.page
+    
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor((False, self._position(self.page[-1])))
+    
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Ran past either end (e.g. a filter changed under the cursor)
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor((True, self._position(self.page[0])))
+    
+    def encode_cursor(self, cursor):
+        reverse, (created_at, pk) = cursor
+        tokens = {'p': f'{created_at.isoformat()}|{pk}'}
+        if reverse:
+            tokens['r'] = '1'
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+    
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            raw_created_at, raw_pk = tokens['p'][0].split('|')
+            created_at = parse_datetime(raw_created_at)
+            pk = uuid.UUID(raw_pk)
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        
+        if created_at is None or created_at.tzinfo is None:
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, (created_at, pk)
+    
+    @staticmethod
+    def _position(invoice):
+        return invoice.created_at, invoice.pk
+
+
+class InvoicePagination(PageNumberPagination):
+    """
+    Page-number pagination (count/next/previous) by default, switching to
+    InvoiceCursorPagination when the client asks for it with
+    ?pagination=cursor or follows a ?cursor= link.
+    """
+    
+    def __init__(self):
+        self.cursor_paginator = InvoiceCursorPagination()
+        self.use_cursor = False
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = (
+            request.query_params.get('pagination') == 'cursor'
+            or self.cursor_paginator.cursor_query_param in request.query_params
+        )
+        if self.use_cursor:
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+    
+    def get_paginated_response(self, data):
+        if self.use_cursor:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,614 @@
+"""
+Invoice PDF Rendering
+Template-driven invoice PDFs with no external rendering dependencies
+"""
+import hashlib
+import json
+import re
+import struct
+import textwrap
+import zlib
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.template.loader import get_template
+
+
+# A4 portrait in PDF points
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+
+
+class PDFEncodingError(ValueError):
+    """Text cannot be drawn with the configured font."""
+
+
+class PDFFont:
+    """
+    Standard PDF Type 1 font (no embedding required).
+    
+    Courier is fixed-pitch (600/1000 em per glyph), which keeps the
+    template's column alignment intact in the rendered page.
+    """
+    
+    # Identifies the font in the cached-PDF content hash; empty for the
+    # default font, so hashes from before fonts were configurable stay valid
+    identity = ''
+    
+    def __init__(self, name: str = 'Courier', size: float = 9, leading: float = 11):
+        self.name = name
+        self.size = size
+        self.leading = leading
+        self.char_width = size * 0.6
+        self.resource = (
+            f'<< /Type /Font /Subtype /Type1 /BaseFont /{name} '
+            f'/Encoding /WinAnsiEncoding >>'
+        ).encode('ascii')
+    
+    @property
+    def chars_per_line(self) -> int:
+        return int((PAGE_WIDTH - 2 * MARGIN) / self.char_width)
+    
+    @property
+    def lines_per_page(self) -> int:
+        return int((PAGE_HEIGHT - 2 * MARGIN) / self.leading)
+    
+    def cells(self, line: str) -> int:
+        """Width of a line in fixed-pitch cells."""
+        return len(line)
+    
+    def wrap(self, line: str) -> list[str]:
+        return textwrap.wrap(line, self.chars_per_line, drop_whitespace=False) or ['']
+    
+    def encode(self, line: str, used: dict) -> bytes:
+        """
+        A line as a PDF string operand (WinAnsi literal string).
+        
+        Args:
+            line: Text to draw
+            used: Per-document record of glyphs drawn (see objects)
+        
+        Raises:
+            PDFEncodingError: The line has characters outside WinAnsi
+        """
+        try:
+            data = line.encode('cp1252')
+        except UnicodeEncodeError as e:
+            raise PDFEncodingError(
+                f"{line[e.start:e.end]!r} cannot be rendered in {self.name}; "
+                f"set INVOICE_PDF_FONT to a TrueType font that covers it"
+            ) from None
+        return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+    
+    def objects(self, font_num: int, next_num: int, used: dict) -> dict:
+        """PDF objects for the font: the font dictionary at font_num."""
+        return {font_num: self.resource}
+
+
+class TrueTypePDFFont(PDFFont):
+    """
+    TrueType font embedded as a Type0/CIDFontType2 font (Identity-H).
+    
+    Used for text outside WinAnsi, e.g. Chinese or Tamil names. Glyphs are
+    looked up in the font's cmap (no shaping, so scripts that need
+    ligatures or reordering render glyph by glyph), and only the glyphs a
+    document uses are embedded. A ToUnicode map keeps the text
+    searchable and copyable. Characters the font has no glyph for raise
+    PDFEncodingError instead of being drawn as '?'.
+    
+    Layout assumes a monospaced font: a glyph's width in cells is its
+    advance divided by the advance of '0', so double-width CJK glyphs of
+    a CJK monospaced font take two columns.
+    """
+    
+    def __init__(self, path: str, size: float = 9, leading: float = 11):
+        self.ttf = TrueTypeFile(path)
+        super().__init__(self.ttf.postscript_name, size, leading)
+        self.identity = f'{self.ttf.postscript_name}:{self.ttf.digest[:16]}'
+        self.cell_units = self.ttf.advance(self.ttf.glyph_for('0')) or self.ttf.units_per_em // 2
+        self.char_width = size * self.cell_units / self.ttf.units_per_em
+    
+    def cells(self, line: str) -> int:
+        return sum(self._char_cells(char) for char in line)
+    
+    def _char_cells(self, char: str) -> int:
+        gid = self.ttf.glyph_for(char)
+        if not gid:
+            return 1
+        return max(1, round(self.ttf.advance(gid) / self.cell_units))
+    
+    def wrap(self, line: str) -> list[str]:
+        if self.cells(line) == len(line):
+            return super().wrap(line)
+        # Wide glyphs: break by cells, preferring the last space
+        lines, current, width = [], '', 0
+        for char in line:
+            char_cells = self._char_cells(char)
+            if current and width + char_cells > self.chars_per_line:
+                head, space, tail = current.rpartition(' ')
+                if space and head:
+                    lines.append(head + ' ')
+                    current = tail
+                else:
+                    lines.append(current)
+                    current = ''
+                width = self.cells(current)
+            current += char
+            width += char_cells
+        lines.append(current)
+        return lines
+    
+    def encode(self, line: str, used: dict) -> bytes:
+        glyphs = []
+        for char in line:
+            gid = self.ttf.glyph_for(char)
+            if not gid:
+                raise PDFEncodingError(
+                    f"Font {self.name} has no glyph for {char!r} (U+{ord(char):04X})"
+                )
+            used.setdefault(gid, char)
+            glyphs.append(gid)
+        return b'<' + ''.join(f'{gid:04X}' for gid in glyphs).encode('ascii') + b'>'
+    
+    def objects(self, font_num: int, next_num: int, used: dict) -> dict:
+        """
+        Type0 font at font_num; descendant font, descriptor, font file and
+        ToUnicode map from next_num.
+        
+        Args:
+            used: Glyph ID -> character for every glyph the document draws
+        """
+        ttf = self.ttf
+        cid_num, descriptor_num, file_num, unicode_num = range(next_num, next_num + 4)
+        
+        # Subset tag: six letters derived from the glyphs embedded
+        digest = hashlib.sha256(repr(sorted(used)).encode()).digest()
+        base_font = ''.join(chr(65 + byte % 26) for byte in digest[:6]) + '+' + self.name
+        
+        scale = 1000 / ttf.units_per_em
+        widths = ' '.join(f'{gid} [{round(ttf.advance(gid) * scale)}]' for gid in sorted(used))
+        x_min, y_min, x_max, y_max = (round(value * scale) for value in ttf.bbox)
+        font_file = ttf.subset(used)
+        compressed = zlib.compress(font_file)
+        
+        to_unicode = [
+            '/CIDInit /ProcSet findresource begin 12 dict begin begincmap',
+            '/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def',
+            '/CMapName /Adobe-Identity-UCS def /CMapType 2 def',
+            '1 begincodespacerange <0000> <FFFF> endcodespacerange',
+        ]
+        mappings = sorted(used.items())
+        for start in range(0, len(mappings), 100):
+            block = mappings[start:start + 100]
+            to_unicode.append(f'{len(block)} beginbfchar')
+            to_unicode.extend(
+                f'<{gid:04X}> <{char.encode("utf-16-be").hex().upper()}>' for gid, char in block
+            )
+            to_unicode.append('endbfchar')
+        to_unicode.append('endcmap CMapName currentdict /CMap defineresource pop end end')
+        to_unicode_stream = zlib.compress('\n'.join(to_unicode).encode('ascii'))
+        
+        return {
+            font_num: (
+                f'<< /Type /Font /Subtype /Type0 /BaseFont /{base_font} /Encoding /Identity-H '
+                f'/DescendantFonts [{cid_num} 0 R] /ToUnicode {unicode_num} 0 R >>'
+            ).encode('ascii'),
+            cid_num: (
+                f'<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{base_font} '
+                f'/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> '
+                f'/FontDescriptor {descriptor_num} 0 R /W [{widths}] /CIDToGIDMap /Identity >>'
+            ).encode('ascii'),
+            descriptor_num: (
+                f'<< /Type /FontDescriptor /FontName /{base_font} '
+                f'/Flags {4 | (1 if ttf.is_fixed_pitch else 0)} '
+                f'/FontBBox [{x_min} {y_min} {x_max} {y_max}] /ItalicAngle 0 '
+                f'/Ascent {round(ttf.ascent * scale)} /Descent {round(ttf.descent * scale)} '
+                f'/CapHeight {round(ttf.cap_height * scale)} /StemV 80 /FontFile2 {file_num} 0 R >>'
+            ).encode('ascii'),
+            file_num: _stream(compressed, f'/Length1 {len(font_file)} /Filter /FlateDecode'),
+            unicode_num: _stream(to_unicode_stream, '/Filter /FlateDecode'),
+        }
+
+
+class TrueTypeFile:
+    """
+    The parts of a TrueType (glyf outline) font file needed to embed it.
+    
+    OpenType/CFF fonts and font collections (.ttc) are not supported.
+    """
+    
+    # Tables kept in embedded subsets (cmap is not needed with Identity-H)
+    SUBSET_TABLES = (b'head', b'hhea', b'hmtx', b'maxp', b'loca', b'glyf', b'cvt ', b'fpgm', b'prep')
+    
+    def __init__(self, path: str):
+        try:
+            self.data = Path(path).read_bytes()
+        except OSError as e:
+            raise ImproperlyConfigured(f"INVOICE_PDF_FONT cannot be read: {e}") from None
+        data = self.data
+        if data[:4] not in (b'\x00\x01\x00\x00', b'true'):
+            raise ImproperlyConfigured(
+                f"INVOICE_PDF_FONT must be a TrueType (.ttf) font with glyf outlines: {path}"
+            )
+        self.digest = hashlib.sha256(data).hexdigest()
+        
+        num_tables = struct.unpack_from('>H', data, 4)[0]
+        self.tables = {}
+        for index in range(num_tables):
+            tag, _, offset, length = struct.unpack_from('>4sIII', data, 12 + 16 * index)
+            self.tables[tag] = (offset, length)
+        missing = {b'head', b'hhea', b'hmtx', b'maxp', b'cmap', b'loca', b'glyf'} - set(self.tables)
+        if missing:
+            raise ImproperlyConfigured(f"INVOICE_PDF_FONT lacks tables {sorted(missing)}: {path}")
+        
+        head = self.tables[b'head'][0]
+        self.units_per_em = struct.unpack_from('>H', data, head + 18)[0]
+        self.bbox = struct.unpack_from('>hhhh', data, head + 36)
+        self.long_loca = struct.unpack_from('>h', data, head + 50)[0] == 1
+        
+        hhea = self.tables[b'hhea'][0]
+        self.ascent, self.descent = struct.unpack_from('>hh', data, hhea + 4)
+        num_metrics = struct.unpack_from('>H', data, hhea + 34)[0]
+        self.num_glyphs = struct.unpack_from('>H', data, self.tables[b'maxp'][0] + 4)[0]
+        hmtx = self.tables[b'hmtx'][0]
+        self.advances = [struct.unpack_from('>H', data, hmtx + 4 * index)[0] for index in range(num_metrics)]
+        
+        self.cap_height = self.ascent
+        if b'OS/2' in self.tables:
+            os2, length = self.tables[b'OS/2']
+            if struct.unpack_from('>H', data, os2)[0] >= 2 and length >= 90:
+                self.cap_height = struct.unpack_from('>h', data, os2 + 88)[0]
+        self.is_fixed_pitch = (
+            b'post' in self.tables and struct.unpack_from('>I', data, self.tables[b'post'][0] + 12)[0] != 0
+        )
+        
+        self.cmap = self._read_cmap()
+        self.postscript_name = self._read_postscript_name() or re.sub(r'[^A-Za-z0-9-]', '', Path(path).stem)
+    
+    def glyph_for(self, char: str) -> int:
+        return self.cmap.get(ord(char), 0)
+    
+    def advance(self, gid: int) -> int:
+        return self.advances[min(gid, len(self.advances) - 1)]
+    
+    def _read_cmap(self) -> dict:
+        data = self.data
+        cmap = self.tables[b'cmap'][0]
+        subtables = {}
+        for index in range(struct.unpack_from('>H', data, cmap + 2)[0]):
+            platform, encoding, offset = struct.unpack_from('>HHI', data, cmap + 4 + 8 * index)
+            subtables[(platform, encoding)] = cmap + offset
+        
+        # Prefer full Unicode (format 12), then the BMP (format 4)
+        for key in ((3, 10), (0, 4), (0, 6), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0)):
+            offset = subtables.get(key)
+            if offset is None:
+                continue
+            fmt = struct.unpack_from('>H', data, offset)[0]
+            if fmt == 12:
+                return self._read_cmap_12(offset)
+            if fmt == 4:
+                return self._read_cmap_4(offset)
+        raise ImproperlyConfigured("INVOICE_PDF_FONT has no Unicode cmap (format 4 or 12)")
+    
+    def _read_cmap_4(self, offset: int) -> dict:
+        data = self.data
+        seg_x2 = struct.unpack_from('>H', data, offset + 6)[0]
+        ends = offset + 14
+        starts = ends + seg_x2 + 2
+        deltas = starts + seg_x2
+        range_offsets = deltas + seg_x2
+        mapping = {}
+        for seg in range(0, seg_x2, 2):
+            end, start = struct.unpack_from('>H', data, ends + seg)[0], struct.unpack_from('>H', data, starts + seg)[0]
+            delta = struct.unpack_from('>h', data, deltas + seg)[0]
+            range_offset = struct.unpack_from('>H', data, range_offsets + seg)[0]
+            for code in range(start, min(end, 0xFFFE) + 1):
+                if range_offset:
+                    gid = struct.unpack_from('>H', data, range_offsets + seg + range_offset + 2 * (code - start))[0]
+                    if gid:
+                        gid = (gid + delta) & 0xFFFF
+                else:
+                    gid = (code + delta) & 0xFFFF
+                if gid:
+                    mapping[code] = gid
+        return mapping
+    
+    def _read_cmap_12(self, offset: int) -> dict:
+        data = self.data
+        mapping = {}
+        for index in range(struct.unpack_from('>I', data, offset + 12)[0]):
+            start, end, gid = struct.unpack_from('>III', data, offset + 16 + 12 * index)
+            for code in range(start, end + 1):
+                mapping[code] = gid + code - start
+        return mapping
+    
+    def _read_postscript_name(self) -> str:
+        if b'name' not in self.tables:
+            return ''
+        data = self.data
+        table = self.tables[b'name'][0]
+        count, strings = struct.unpack_from('>HH', data, table + 2)
+        for index in range(count):
+            platform, encoding, _, name_id, length, offset = struct.unpack_from('>6H', data, table + 6 + 12 * index)
+            if name_id != 6:
+                continue
+            raw = data[table + strings + offset:table + strings + offset + length]
+            name = raw.decode('utf-16-be' if platform in (0, 3) else 'latin-1', errors='ignore')
+            name = re.sub(r'[^A-Za-z0-9-]', '', name)
+            if name:
+                return name
+        return ''
+    
+    def _glyph(self, gid: int) -> bytes:
+        data = self.data
+        loca = self.tables[b'loca'][0]
+        if self.long_loca:
+            start, end = struct.unpack_from('>II', data, loca + 4 * gid)
+        else:
+            start, end = (value * 2 for value in struct.unpack_from('>HH', data, loca + 2 * gid))
+        glyf = self.tables[b'glyf'][0]
+        return data[glyf + start:glyf + end]
+    
+    def _components(self, glyph: bytes) -> list[int]:
+        """Glyph IDs referenced by a composite glyph."""
+        if len(glyph) < 10 or struct.unpack_from('>h', glyph, 0)[0] >= 0:
+            return []
+        components = []
+        offset = 10
+        while True:
+            flags, gid = struct.unpack_from('>HH', glyph, offset)
+            components.append(gid)
+            offset += 4 + (4 if flags & 0x0001 else 2)
+            if flags & 0x0008:
+                offset += 2
+            elif flags & 0x0040:
+                offset += 4
+            elif flags & 0x0080:
+                offset += 8
+            if not flags & 0x0020:
+                return components
+    
+    def subset(self, gids) -> bytes:
+        """
+        The font with only the given glyphs' outlines (plus .notdef and
+        composite components). Glyph IDs are unchanged, so CIDs still map
+        to glyphs by identity.
+        """
+        keep = {0}
+        pending = [gid for gid in gids if gid < self.num_glyphs]
+        while pending:
+            gid = pending.pop()
+            if gid in keep:
+                continue
+            keep.add(gid)
+            pending.extend(self._components(self._glyph(gid)))
+        
+        glyf = bytearray()
+        loca = []
+        for gid in range(self.num_glyphs):
+            loca.append(len(glyf))
+            if gid in keep:
+                glyph = self._glyph(gid)
+                glyf += glyph + b'\x00' * (-len(glyph) % 4)
+        loca.append(len(glyf))
+        
+        tables = {}
+        for tag in self.SUBSET_TABLES:
+            if tag in self.tables:
+                offset, length = self.tables[tag]
+                tables[tag] = self.data[offset:offset + length]
+        head = bytearray(tables[b'head'])
+        head[8:12] = b'\x00\x00\x00\x00'  # checkSumAdjustment, set below
+        head[50:52] = struct.pack('>h', 1)  # long loca
+        tables[b'head'] = bytes(head)
+        tables[b'loca'] = struct.pack(f'>{len(loca)}I', *loca)
+        tables[b'glyf'] = bytes(glyf)
+        
+        return _build_sfnt(tables)
+
+
+def _build_sfnt(tables: dict) -> bytes:
+    """Serialize TrueType tables into a font file with valid checksums."""
+    num_tables = len(tables)
+    entry_selector = max(num_tables.bit_length() - 1, 0)
+    search_range = 16 * 2 ** entry_selector
+    header = struct.pack(
+        '>IHHHH', 0x00010000, num_tables, search_range, entry_selector, num_tables * 16 - search_range
+    )
+    
+    records = bytearray()
+    body = bytearray()
+    offset = 12 + 16 * num_tables
+    head_offset = None
+    for tag in sorted(tables):
+        table = tables[tag]
+        if tag == b'head':
+            head_offset = offset + len(body)
+        records += struct.pack('>4sIII', tag, _checksum(table), offset + len(body), len(table))
+        body += table + b'\x00' * (-len(table) % 4)
+    
+    font = bytearray(header + records + body)
+    adjustment = (0xB1B0AFBA - _checksum(bytes(font))) & 0xFFFFFFFF
+    font[head_offset + 8:head_offset + 12] = struct.pack('>I', adjustment)
+    return bytes(font)
+
+
+def _checksum(data: bytes) -> int:
+    data += b'\x00' * (-len(data) % 4)
+    return sum(struct.unpack(f'>{len(data) // 4}I', data)) & 0xFFFFFFFF
+
+
+def _stream(data: bytes, entries: str) -> bytes:
+    """A PDF stream object with its Length and extra dictionary entries."""
+    return (
+        f'<< /Length {len(data)} {entries} >>\nstream\n'.encode('ascii')
+        + data
+        + b'\nendstream'
+    )
+
+
+def build_pdf(lines: list[str], font: PDFFont) -> bytes:
+    """
+    Lay out text lines onto A4 pages and serialize a PDF document.
+    
+    Output is deterministic for the same input (no timestamps or IDs), so
+    identical invoices produce byte-identical files.
+    """
+    wrapped = []
+    for line in lines:
+        wrapped.extend(font.wrap(line))
+    
+    pages = [
+        wrapped[i:i + font.lines_per_page]
+        for i in range(0, len(wrapped), font.lines_per_page)
+    ] or [[]]
+    
+    # Object numbers: 1 catalog, 2 page tree, 3 font, then page/content
+    # pairs, then any objects the font needs (embedded font files)
+    objects = {}
+    used = {}
+    kids = []
+    for index, page_lines in enumerate(pages):
+        page_num = 4 + index * 2
+        content_num = page_num + 1
+        kids.append(f'{page_num} 0 R')
+        
+        text = [
+            b'BT',
+            f'/F1 {font.size:g} Tf {font.leading:g} TL'.encode('ascii'),
+            f'{MARGIN} {PAGE_HEIGHT - MARGIN - font.size:g} Td'.encode('ascii'),
+        ]
+        for line in page_lines:
+            text.append(font.encode(line, used) + b" '")
+        text.append(b'ET')
+        stream = zlib.compress(b'\n'.join(text))
+        
+        objects[page_num] = (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_num} 0 R >>'
+        ).encode('ascii')
+        objects[content_num] = _stream(stream, '/Filter /FlateDecode')
+    
+    objects.update(font.objects(3, 4 + len(pages) * 2, used))
+    objects[1] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[2] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'.encode('ascii')
+    
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = {}
+    for num in sorted(objects):
+        offsets[num] = len(out)
+        out += f'{num} 0 obj\n'.encode('ascii') + objects[num] + b'\nendobj\n'
+    
+    xref_offset = len(out)
+    size = max(objects) + 1
+    out += f'xref\n0 {size}\n0000000000 65535 f \n'.encode('ascii')
+    for num in range(1, size):
+        out += f'{offsets[num]:010d} 00000 n \n'.encode('ascii')
+    out += (
+        f'trailer\n<< /Size {size} /Root 1 0 R >>\n'
+        f'startxref\n{xref_offset}\n%%EOF\n'
+    ).encode('ascii')
+    return bytes(out)
+
+
+class InvoicePDFRenderer:
+    """
+    Renders invoices to PDF from the billing/invoice_pdf.txt template.
+    
+    The template is compiled and the font prepared once per renderer, so a
+    single instance can be reused across many invoices. Text is drawn in
+    Courier (WinAnsi only) unless INVOICE_PDF_FONT names a TrueType font to
+    embed; text the font cannot draw raises PDFEncodingError rather than
+    being printed as '?'.
+    """
+    
+    TEMPLATE_NAME = 'billing/invoice_pdf.txt'
+    # Bump when the template or layout changes to invalidate cached PDFs
+    TEMPLATE_VERSION = '1'
+    
+    def __init__(self):
+        self.template = get_template(self.TEMPLATE_NAME)
+        if settings.INVOICE_PDF_FONT:
+            self.font = TrueTypePDFFont(settings.INVOICE_PDF_FONT)
+        else:
+            self.font = PDFFont()
+    
+    def get_context(self, invoice) -> dict:
+        """Everything printed on the invoice (and hashed for caching)."""
+        organization = invoice.organization
+        address = organization.billing_address or {}
+        
+        return {
+            'invoice_number': invoice.invoice_number,
+            'status': invoice.get_status_display(),
+            'issue_date': invoice.created_at.date().isoformat() if invoice.created_at else '',
+            'due_date': invoice.due_date.date().isoformat(),
+            'paid_at': invoice.paid_at.date().isoformat() if invoice.paid_at else '',
+            'currency': invoice.currency,
+            'organization': {
+                'name': organization.name,
+                'uen': organization.uen,
+                'gst_reg_no': organization.gst_reg_no or '',
+                'is_gst_registered': organization.is_gst_registered,
+                'billing_email': organization.billing_email,
+                'address_lines': [str(value) for value in address.values() if value],
+            },
+            'iras_transaction_code': invoice.iras_transaction_code,
+            'iras_transaction_label': invoice.get_iras_transaction_code_display(),
+            'gst_rate_percent': f'{(invoice.gst_rate * 100).normalize():f}',
+            'line_items': [
+                {
+                    'description': str(item.get('description', '')),
+                    'quantity': str(item.get('quantity', 1)),
+                    'amount': _format_cents(item.get('amount_cents', 0)),
+                }
+                for item in (invoice.line_items or [])
+                if isinstance(item, dict)
+            ],
+            'subtotal': _format_cents(invoice.subtotal_cents),
+            'gst_amount': _format_cents(invoice.gst_amount_cents or 0),
+            'total': _format_cents(invoice.total_amount_cents or 0),
+            'amount_paid': _format_cents(invoice.amount_paid_cents),
+            'amount_due': _format_cents(invoice.amount_due_cents),
+        }
+    
+    def content_hash(self, invoice, context: dict = None) -> str:
+        """SHA-256 of the printed content; unchanged invoices hash identically."""
+        payload = {
+            'template_version': self.TEMPLATE_VERSION,
+            'context': context if context is not None else self.get_context(invoice),
+        }
+        if self.font.identity:
+            payload['font'] = self.font.identity
+        return hashlib.sha256(
+            json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str).encode()
+        ).hexdigest()
+    
+    def render(self, invoice, context: dict = None) -> bytes:
+        """Render the invoice to PDF bytes."""
+        context = context if context is not None else self.get_context(invoice)
+        text = self.template.render(context)
+        return build_pdf(text.splitlines(), self.font)
+
+
+def _format_cents(cents) -> str:
+    return f'{int(cents) / 100:,.2f}'
+
+
+_renderer = None
+
+
+def get_renderer() -> InvoicePDFRenderer:
+    """
+    Process-wide warm renderer.
+    
+    Celery workers reuse the compiled template and font across tasks
+    instead of paying the setup cost per invoice.
+    """
+    global _renderer
+    if _renderer is None:
+        _renderer = InvoicePDFRenderer()
+    return _renderer
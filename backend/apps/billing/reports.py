@@ -0,0 +1,199 @@
+"""
+GST Reporting
+IRAS GST F5 return totals and line-level audit exports
+"""
+import csv
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Iterator
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Invoice
+
+
+class _Echo:
+    """File-like object whose write() returns the line for streaming."""
+    
+    def write(self, value):
+        return value
+
+
+class GSTF5Report:
+    """
+    GST F5 return for one calendar quarter.
+    
+    Totals come from a single grouped aggregation over the quarter's
+    invoices (by issue date, Singapore time); the line-level audit file is
+    streamed from a server-side cursor so no more than one chunk of rows is
+    held in memory. Once a quarter is finalized (GST_F5_FINALIZE_DAYS after
+    it ends) its totals are cached indefinitely.
+    
+    Box mapping by IRAS transaction code:
+    - SR: Box 1 (standard-rated supplies), GST in Box 6 (output tax)
+    - ZR: Box 2 (zero-rated supplies)
+    - TX: Box 3 (exempt supplies)
+    - OS: Out of scope, reported separately and excluded from Box 4
+    """
+    
+    # Issued invoices; drafts were never sent and voids were cancelled
+    REPORTABLE_STATUSES = ('open', 'paid', 'uncollectible')
+    
+    BOXES = {
+        'SR': 'box_1',
+        'ZR': 'box_2',
+        'TX': 'box_3',
+    }
+    
+    AUDIT_COLUMNS = [
+        'invoice_number',
+        'issue_date',
+        'organization',
+        'uen',
+        'customer_gst_reg_no',
+        'iras_transaction_code',
+        'f5_box',
+        'currency',
+        'status',
+        'subtotal',
+        'gst_amount',
+        'total',
+    ]
+    
+    CACHE_KEY = 'billing:gst-f5:{year}Q{quarter}:v1'
+    
+    def __init__(self, year: int, quarter: int):
+        if quarter not in (1, 2, 3, 4):
+            raise ValueError('quarter must be between 1 and 4')
+        self.year = year
+        self.quarter = quarter
+        
+        first_month = (quarter - 1) * 3 + 1
+        self.start = timezone.make_aware(datetime(year, first_month, 1))
+        if quarter == 4:
+            self.end = timezone.make_aware(datetime(year + 1, 1, 1))
+        else:
+            self.end = timezone.make_aware(datetime(year, first_month + 3, 1))
+    
+    @property
+    def period(self) -> str:
+        return f'{self.year}-Q{self.quarter}'
+    
+    @property
+    def is_finalized(self) -> bool:
+        """Whether the quarter is closed for amendments."""
+        grace = timedelta(days=settings.GST_F5_FINALIZE_DAYS)
+        return timezone.now() >= self.end + grace
+    
+    def get_queryset(self):
+        return Invoice.objects.filter(
+            created_at__gte=self.start,
+            created_at__lt=self.end,
+            status__in=self.REPORTABLE_STATUSES,
+        )
+    
+    def totals(self) -> dict:
+        """
+        Compute F5 box totals (cached once the quarter is finalized).
+        
+        Returns:
+            dict: Box values in cents plus per-code breakdown
+        """
+        finalized = self.is_finalized
+        key = self.CACHE_KEY.format(year=self.year, quarter=self.quarter)
+        if finalized:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        
+        rows = self.get_queryset().values('iras_transaction_code').annotate(
+            invoice_count=Count('id'),
+            supplies_cents=Sum('subtotal_cents'),
+            gst_cents=Sum('gst_amount_cents'),
+        ).order_by()
+        
+        by_code = {
+            code: {'invoice_count': 0, 'supplies_cents': 0, 'gst_cents': 0}
+            for code, _ in Invoice.IRAS_CODE_CHOICES
+        }
+        for row in rows:
+            by_code[row['iras_transaction_code']] = {
+                'invoice_count': row['invoice_count'],
+                'supplies_cents': row['supplies_cents'] or 0,
+                'gst_cents': row['gst_cents'] or 0,
+            }
+        
+        boxes = {box: by_code[code]['supplies_cents'] for code, box in self.BOXES.items()}
+        boxes['box_4'] = boxes['box_1'] + boxes['box_2'] + boxes['box_3']
+        boxes['box_6'] = by_code['SR']['gst_cents']
+        
+        result = {
+            'period': self.period,
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'finalized': finalized,
+            'boxes': boxes,
+            'out_of_scope_cents': by_code['OS']['supplies_cents'],
+            'by_code': by_code,
+        }
+        
+        if finalized:
+            cache.set(key, result, timeout=None)
+        return result
+    
+    def audit_rows(self, chunk_size: int = 2000) -> Iterator[dict]:
+        """
+        Stream one dict per invoice, ordered by issue date.
+        
+        Uses QuerySet.iterator(), which reads through a server-side cursor
+        on PostgreSQL.
+        """
+        rows = self.get_queryset().order_by('created_at', 'id').values_list(
+            'invoice_number',
+            'created_at',
+            'organization__name',
+            'organization__uen',
+            'organization__gst_reg_no',
+            'iras_transaction_code',
+            'currency',
+            'status',
+            'subtotal_cents',
+            'gst_amount_cents',
+            'total_amount_cents',
+        ).iterator(chunk_size=chunk_size)
+        
+        for number, created_at, name, uen, gst_reg_no, code, currency, status, subtotal, gst, total in rows:
+            yield {
+                'invoice_number': number,
+                'issue_date': timezone.localtime(created_at).date().isoformat(),
+                'organization': name,
+                'uen': uen,
+                'customer_gst_reg_no': gst_reg_no or '',
+                'iras_transaction_code': code,
+                'f5_box': self.BOXES.get(code, 'out_of_scope'),
+                'currency': currency,
+                'status': status,
+                'subtotal': _cents_to_dollars(subtotal),
+                'gst_amount': _cents_to_dollars(gst),
+                'total': _cents_to_dollars(total),
+            }
+    
+    def stream_csv(self) -> Iterator[str]:
+        """Yield the audit file as CSV lines."""
+        writer = csv.DictWriter(_Echo(), fieldnames=self.AUDIT_COLUMNS)
+        yield writer.writeheader()
+        for row in self.audit_rows():
+            yield writer.writerow(row)
+    
+    def stream_ndjson(self) -> Iterator[str]:
+        """Yield the audit file as newline-delimited JSON."""
+        for row in self.audit_rows():
+            yield json.dumps(row) + '\n'
+
+
+def _cents_to_dollars(cents) -> str:
+    return str((Decimal(cents or 0) / 100).quantize(Decimal('0.01')))
@@ -5,7 +5,7 @@ DRF serializers for Invoice model
 from rest_framework import serializers
 from decimal import Decimal
 
-from .models import Invoice
+from .models import Invoice, OrganizationBillingSummary
 
 
 class InvoiceSerializer(serializers.ModelSerializer):
@@ -83,6 +83,80 @@ class InvoiceCreateSerializer(serializers.ModelSerializer):
         return value
 
 
+class InvoiceBulkItemSerializer(serializers.Serializer):
+    """Serializer for a single invoice in a bulk create request."""
+    
+    organization_id = serializers.UUIDField()
+    subscription_id = serializers.UUIDField(required=False, allow_null=True)
+    subtotal_cents = serializers.IntegerField(min_value=1)
+    gst_rate = serializers.DecimalField(max_digits=5, decimal_places=4, required=False)
+    iras_transaction_code = serializers.ChoiceField(
+        choices=Invoice.IRAS_CODE_CHOICES,
+        required=False
+    )
+    currency = serializers.CharField(max_length=3, required=False)
+    due_date = serializers.DateTimeField(required=False)
+    line_items = serializers.JSONField(required=False)
+    stripe_invoice_id = serializers.CharField(max_length=255, required=False)
+
+
+class InvoiceBulkCreateSerializer(serializers.Serializer):
+    """Serializer for bulk invoice creation (month-end billing runs)."""
+    
+    MAX_INVOICES = 1000
+    
+    invoices = InvoiceBulkItemSerializer(many=True, allow_empty=False, max_length=MAX_INVOICES)
+    
+    def validate_invoices(self, value):
+        """Check organization access, subscriptions and Stripe ID uniqueness with one query each."""
+        from apps.organizations.models import OrganizationMembership
+        from apps.subscriptions.models import Subscription
+        
+        request = self.context.get('request')
+        org_ids = {item['organization_id'] for item in value}
+        admin_org_ids = set(
+            OrganizationMembership.objects.filter(
+                user=request.user,
+                organization_id__in=org_ids,
+                role__in=['owner', 'admin']
+            ).values_list('organization_id', flat=True)
+        )
+        if org_ids - admin_org_ids:
+            raise serializers.ValidationError(
+                'You must be an admin of every organization being invoiced.'
+            )
+        
+        # Subscriptions must exist and belong to the invoice's organization
+        subscription_ids = {item['subscription_id'] for item in value if item.get('subscription_id')}
+        subscription_orgs = dict(
+            Subscription.objects.filter(id__in=subscription_ids).values_list('id', 'organization_id')
+        )
+        invalid = sorted({
+            str(item['subscription_id'])
+            for item in value
+            if item.get('subscription_id')
+            and subscription_orgs.get(item['subscription_id']) != item['organization_id']
+        })
+        if invalid:
+            raise serializers.ValidationError(
+                f"Subscriptions not found for the invoiced organization: {', '.join(invalid)}"
+            )
+        
+        stripe_ids = [item['stripe_invoice_id'] for item in value if item.get('stripe_invoice_id')]
+        if len(stripe_ids) != len(set(stripe_ids)):
+            raise serializers.ValidationError('Duplicate stripe_invoice_id in request.')
+        existing = list(
+            Invoice.objects.filter(stripe_invoice_id__in=stripe_ids)
+            .values_list('stripe_invoice_id', flat=True)[:10]
+        )
+        if existing:
+            raise serializers.ValidationError(
+                f"Invoices already exist for stripe_invoice_id: {', '.join(existing)}"
+            )
+        
+        return value
+
+
 class InvoiceUpdateSerializer(serializers.ModelSerializer):
     """Serializer for updating invoices."""
     
@@ -100,3 +174,30 @@ class MarkPaidSerializer(serializers.Serializer):
     """Serializer for marking invoice as paid."""
     
     payment_intent_id = serializers.CharField(required=False, allow_blank=True)
+
+
+class OrganizationBillingSummarySerializer(serializers.ModelSerializer):
+    """Serializer for an organization's billing totals."""
+    
+    class Meta:
+        model = OrganizationBillingSummary
+        fields = [
+            'organization',
+            'invoice_count',
+            'open_invoice_count',
+            'outstanding_cents',
+            'overdue_count',
+            'overdue_cents',
+            'overdue_as_of',
+            'lifetime_paid_cents',
+            'updated_at',
+        ]
+        read_only_fields = fields
+
+
+class GSTReportPeriodSerializer(serializers.Serializer):
+    """Query parameters selecting a GST F5 quarter."""
+    
+    year = serializers.IntegerField(min_value=2000, max_value=2100)
+    quarter = serializers.IntegerField(min_value=1, max_value=4)
+    export = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
@@ -2,13 +2,18 @@
 Billing Services
 Business logic for invoice management
 """
+from collections import Counter, defaultdict
 from datetime import timedelta
 from django.utils import timezone
 from django.db import transaction
 
+from apps.core.storage import file_url, upload_file
+from apps.events.models import Event
+from apps.events.writer import get_writer
 from apps.organizations.models import Organization
 
-from .models import Invoice
+from .models import Invoice, OrganizationBillingSummary
+from .models.sequence import invoice_number_allocator
 
 
 class InvoiceService:
@@ -46,11 +51,82 @@ class InvoiceService:
             **kwargs
         )
         
-        # Refresh to get GeneratedField values
-        invoice.refresh_from_db()
-        
+        # GeneratedField GST values are populated from INSERT ... RETURNING,
+        # so no refresh_from_db() round trip is needed.
         return invoice
     
+    @staticmethod
+    @transaction.atomic
+    def create_invoices_bulk(
+        invoices: list[dict],
+        user=None,
+        due_days: int = 30,
+        batch_size: int = 1000,
+    ) -> list[Invoice]:
+        """
+        Create many invoices in one transaction (month-end billing runs).
+        
+        Invoice numbers are allocated as one block, rows are written with
+        bulk_create (the GeneratedField GST values come back via RETURNING),
+        and the billing summary updates are written in the same transaction.
+        The matching invoice.created events go through the buffered event
+        writer once it commits.
+        
+        Args:
+            invoices: One dict per invoice with the create_invoice arguments
+                (organization or organization_id, subtotal_cents, optional
+                due_days, stripe_invoice_id and other invoice fields)
+            user: User running the billing run (recorded on events)
+            due_days: Default days until due
+            batch_size: Rows per INSERT statement
+            
+        Returns:
+            list: Created invoices with GST calculated
+        """
+        import uuid
+        
+        if not invoices:
+            return []
+        
+        now = timezone.now()
+        numbers = invoice_number_allocator.allocate(count=len(invoices))
+        
+        objs = []
+        for number, data in zip(numbers, invoices):
+            data = dict(data)
+            days = data.pop('due_days', due_days)
+            data.setdefault('due_date', now + timedelta(days=days))
+            if not data.get('stripe_invoice_id'):
+                data['stripe_invoice_id'] = f'inv_local_{uuid.uuid4().hex[:12]}'
+            objs.append(Invoice(invoice_number=number, **data))
+        
+        Invoice.objects.bulk_create(objs, batch_size=batch_size)
+        
+        # bulk_create bypasses save(), so update each organization's billing
+        # summary once with the combined totals
+        totals = defaultdict(Counter)
+        for invoice in objs:
+            totals[invoice.organization_id].update(invoice.billing_contribution())
+        for organization_id, contribution in totals.items():
+            OrganizationBillingSummary.apply(organization_id, **contribution)
+        
+        user_id = getattr(user, 'id', None)
+        get_writer().emit([
+            Event(
+                event_type='invoice.created',
+                user_id=user_id,
+                organization_id=invoice.organization_id,
+                data={
+                    'invoice_id': str(invoice.id),
+                    'invoice_number': invoice.invoice_number,
+                    'total_amount_cents': invoice.total_amount_cents,
+                },
+            )
+            for invoice in objs
+        ])
+        
+        return objs
+    
     @staticmethod
     def mark_paid(invoice: Invoice, payment_intent_id: str = None) -> Invoice:
         """
@@ -99,41 +175,141 @@ class InvoiceService:
 
 
 class PDFService:
-    """Service for PDF generation."""
+    """
+    Service for PDF generation.
+    
+    PDFs are content-addressed: the stored file name includes a hash of
+    everything printed on the invoice, so an unchanged invoice is never
+    re-rendered and a changed one always gets a fresh file.
+    """
+    
+    LOCK_KEY = 'billing:invoice-pdf-lock:{invoice_id}'
+    
+    @staticmethod
+    def get_storage():
+        """Storage backend for invoice PDFs (STORAGES['invoices'])."""
+        from django.core.files.storage import storages
+        return storages['invoices']
+    
+    @staticmethod
+    def is_current(invoice: Invoice, renderer=None) -> bool:
+        """Check whether the invoice's stored PDF matches its current content."""
+        from .pdf import get_renderer
+        
+        if not invoice.pdf_url or not invoice.pdf_content_hash:
+            return False
+        renderer = renderer or get_renderer()
+        return invoice.pdf_content_hash == renderer.content_hash(invoice)
     
     @staticmethod
-    def generate_invoice_pdf(invoice: Invoice) -> str:
+    def get_storage_name(invoice: Invoice, content_hash: str = None) -> str:
+        """Content-addressed storage path of an invoice PDF."""
+        content_hash = content_hash or invoice.pdf_content_hash
+        return f"invoices/{invoice.organization_id}/{invoice.invoice_number}-{content_hash[:16]}.pdf"
+    
+    @classmethod
+    def get_pdf_url(cls, invoice: Invoice) -> str:
+        """Fresh URL for the stored PDF (signed URLs expire on S3)."""
+        return cls.get_storage().url(cls.get_storage_name(invoice))
+    
+    @classmethod
+    def generate_invoice_pdf(cls, invoice: Invoice, renderer=None) -> str:
         """
         Generate PDF for an invoice.
         
+        Sets invoice.pdf_url and invoice.pdf_content_hash; the caller saves.
+        Rendering is skipped when a PDF for the same content already exists.
+        
         Args:
-            invoice: Invoice to generate PDF for
+            invoice: Invoice to generate PDF for (with organization loaded)
+            renderer: Optional warm InvoicePDFRenderer to reuse
             
         Returns:
             str: URL to the generated PDF
         """
-        # TODO: Implement PDF generation with WeasyPrint or similar
-        # Must include:
-        # - Invoice number
-        # - Organization details (UEN, GST reg no)
-        # - IRAS transaction code
-        # - Subtotal, GST breakdown, Total
+        from .pdf import get_renderer
+        
+        renderer = renderer or get_renderer()
+        context = renderer.get_context(invoice)
+        content_hash = renderer.content_hash(invoice, context)
+        
+        if invoice.pdf_url and invoice.pdf_content_hash == content_hash:
+            return invoice.pdf_url
+        
+        storage = cls.get_storage()
+        name = cls.get_storage_name(invoice, content_hash)
+        if not storage.exists(name):
+            name = upload_file(
+                name,
+                renderer.render(invoice, context),
+                storage='invoices',
+                content_type='application/pdf',
+            )
+        
+        invoice.pdf_url = storage.url(name)
+        invoice.pdf_content_hash = content_hash
+        return invoice.pdf_url
+    
+    @classmethod
+    def request_invoice_pdf(cls, invoice: Invoice) -> bool:
+        """
+        Queue a render task unless one is already queued for this invoice.
+        
+        Returns:
+            bool: True if a task was queued
+        """
+        from django.conf import settings
+        from django.core.cache import cache
+        from .tasks import generate_invoice_pdf
         
-        # For now, return a placeholder
-        return f"https://storage.example.com/invoices/{invoice.id}.pdf"
+        lock_key = cls.LOCK_KEY.format(invoice_id=invoice.id)
+        if not cache.add(lock_key, 1, timeout=settings.INVOICE_PDF_LOCK_TIMEOUT):
+            return False
+        
+        generate_invoice_pdf.delay(str(invoice.id))
+        return True
+    
+    @staticmethod
+    def request_invoice_pdfs_batch(invoice_ids: list, batch_size: int = 200) -> int:
+        """
+        Queue batch render tasks for many invoices (month-end runs).
+        
+        Args:
+            invoice_ids: UUIDs of invoices to render
+            batch_size: Invoices per task
+            
+        Returns:
+            int: Number of tasks queued
+        """
+        from .tasks import generate_invoice_pdfs_batch
+        
+        invoice_ids = [str(invoice_id) for invoice_id in invoice_ids]
+        for i in range(0, len(invoice_ids), batch_size):
+            generate_invoice_pdfs_batch.delay(invoice_ids[i:i + batch_size])
+        return (len(invoice_ids) + batch_size - 1) // batch_size
+    
+    @classmethod
+    def release_lock(cls, invoice_id) -> None:
+        """Release the per-invoice render lock."""
+        from django.core.cache import cache
+        cache.delete(cls.LOCK_KEY.format(invoice_id=invoice_id))
     
     @staticmethod
     def upload_to_s3(pdf_content: bytes, filename: str) -> str:
         """
-        Upload PDF to S3.
+        Upload PDF to invoice storage (S3 in production).
         
         Args:
-            pdf_content: PDF file content
+            pdf_content: PDF file content (bytes or an iterable of chunks)
             filename: Filename to use
             
         Returns:
-            str: S3 URL
+            str: URL of the stored file
         """
-        # TODO: Implement S3 upload with boto3
-        import uuid
-        return f"https://s3.ap-southeast-1.amazonaws.com/invoices/{uuid.uuid4()}/{filename}"
+        name = upload_file(
+            f"invoices/{filename}",
+            pdf_content,
+            storage='invoices',
+            content_type='application/pdf',
+        )
+        return file_url(name, storage='invoices')
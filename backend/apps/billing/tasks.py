@@ -2,8 +2,11 @@
 Billing Celery Tasks
 Background tasks for invoice processing
 """
+import logging
 from celery import shared_task
 
+logger = logging.getLogger(__name__)
+
 
 @shared_task(queue='default')
 def generate_invoice_pdf(invoice_id: str) -> dict:
@@ -20,18 +23,76 @@ def generate_invoice_pdf(invoice_id: str) -> dict:
     from .services import PDFService
     
     try:
-        invoice = Invoice.objects.get(id=invoice_id)
-    except Invoice.DoesNotExist:
-        return {'error': 'Invoice not found'}
+        try:
+            invoice = Invoice.objects.select_related('organization').get(id=invoice_id)
+        except Invoice.DoesNotExist:
+            return {'error': 'Invoice not found'}
+        
+        previous_hash = invoice.pdf_content_hash
+        pdf_url = PDFService.generate_invoice_pdf(invoice)
+        
+        # Update invoice with PDF URL (only when the content changed)
+        if invoice.pdf_content_hash != previous_hash:
+            invoice.save(update_fields=['pdf_url', 'pdf_content_hash', 'updated_at'])
+        
+        return {'status': 'success', 'pdf_url': pdf_url}
+    finally:
+        PDFService.release_lock(invoice_id)
+
+
+@shared_task(queue='default')
+def generate_invoice_pdfs_batch(invoice_ids: list) -> dict:
+    """
+    Generate PDFs for a batch of invoices.
     
-    # Generate PDF
-    pdf_url = PDFService.generate_invoice_pdf(invoice)
+    Loads all invoices in one query, renders them with the worker's warm
+    renderer (template and font loaded once), and writes the new URLs with
+    a single bulk_update. Invoices whose content is unchanged are skipped.
     
-    # Update invoice with PDF URL
-    invoice.pdf_url = pdf_url
-    invoice.save(update_fields=['pdf_url', 'updated_at'])
+    Args:
+        invoice_ids: UUIDs of the invoices
+        
+    Returns:
+        dict: Rendered, unchanged, failed and missing counts
+    """
+    from django.utils import timezone
+    from .models import Invoice
+    from .pdf import get_renderer
+    from .services import PDFService
+    
+    invoices = list(
+        Invoice.objects.select_related('organization').filter(id__in=invoice_ids)
+    )
+    renderer = get_renderer()
+    now = timezone.now()
     
-    return {'status': 'success', 'pdf_url': pdf_url}
+    changed = []
+    failed = []
+    for invoice in invoices:
+        previous_hash = invoice.pdf_content_hash
+        try:
+            PDFService.generate_invoice_pdf(invoice, renderer=renderer)
+        except Exception:
+            logger.exception(f"PDF generation failed for invoice {invoice.id}")
+            failed.append(str(invoice.id))
+            continue
+        if invoice.pdf_content_hash != previous_hash:
+            invoice.updated_at = now
+            changed.append(invoice)
+    
+    Invoice.objects.bulk_update(
+        changed,
+        ['pdf_url', 'pdf_content_hash', 'updated_at'],
+        batch_size=500
+    )
+    
+    return {
+        'status': 'success',
+        'rendered': len(changed),
+        'unchanged': len(invoices) - len(changed) - len(failed),
+        'failed': failed,
+        'missing': len(invoice_ids) - len(invoices),
+    }
 
 
 @shared_task(queue='high')
@@ -46,19 +107,22 @@ def process_invoice_payment(invoice_id: str, payment_intent_id: str) -> dict:
     Returns:
         dict: Processing result
     """
+    from django.db import transaction
     from .models import Invoice
     from .services import InvoiceService
     
-    try:
-        invoice = Invoice.objects.get(id=invoice_id)
-    except Invoice.DoesNotExist:
-        return {'error': 'Invoice not found'}
-    
-    if invoice.paid:
-        return {'status': 'already_paid', 'invoice_id': str(invoice_id)}
-    
-    # Mark as paid
-    InvoiceService.mark_paid(invoice, payment_intent_id)
+    with transaction.atomic():
+        try:
+            # Locked, so a concurrent payment cannot be applied twice
+            invoice = Invoice.objects.select_for_update().get(id=invoice_id)
+        except Invoice.DoesNotExist:
+            return {'error': 'Invoice not found'}
+        
+        if invoice.paid:
+            return {'status': 'already_paid', 'invoice_id': str(invoice_id)}
+        
+        # Mark as paid
+        InvoiceService.mark_paid(invoice, payment_intent_id)
     
     # Trigger follow-up tasks
     send_invoice_email.delay(str(invoice_id), template='payment_receipt')
@@ -99,28 +163,193 @@ def send_invoice_email(invoice_id: str, template: str = 'invoice') -> dict:
     }
 
 
+@shared_task(queue='default')
+def send_overdue_reminders(organization_id: str, billing_email: str, invoices: list) -> dict:
+    """
+    Send one overdue reminder covering several invoices of an organization.
+    
+    Carries everything the email needs, so no invoice is re-fetched.
+    last_reminder_sent_at is stamped only once the email has been sent, so
+    a failed send is picked up again by the next sweep.
+    
+    Args:
+        organization_id: UUID of the organization
+        billing_email: Recipient address
+        invoices: Dicts with id, invoice_number, amount_due_cents, currency,
+            due_date
+        
+    Returns:
+        dict: Send result
+    """
+    from django.conf import settings
+    from django.core.mail import send_mail
+    from django.utils import timezone
+    from .models import Invoice
+    
+    if not billing_email:
+        return {'error': 'No billing email', 'organization_id': organization_id}
+    
+    lines = '\n'.join(
+        f"    {item['invoice_number']}: {item['currency']} {item['amount_due_cents'] / 100:.2f} "
+        f"(due {item['due_date'][:10]})"
+        for item in invoices
+    )
+    
+    subject = 'NexusCore: overdue invoice reminder'
+    message = f"""
+    Hello,
+    
+    The following invoices are past their due date:
+    
+{lines}
+    
+    Please arrange payment at your earliest convenience.
+    
+    If you have already paid, please ignore this email.
+    
+    Best regards,
+    The NexusCore Team
+    """
+    
+    send_mail(
+        subject=subject,
+        message=message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[billing_email],
+        fail_silently=False,
+    )
+    
+    Invoice.objects.filter(
+        id__in=[item['id'] for item in invoices]
+    ).update(last_reminder_sent_at=timezone.now())
+    
+    return {
+        'status': 'sent',
+        'organization_id': organization_id,
+        'template': 'overdue_reminder',
+        'recipient': billing_email,
+        'invoice_count': len(invoices),
+    }
+
+
 @shared_task(queue='low')
-def check_overdue_invoices() -> dict:
+def check_overdue_invoices(chunk_size: int = 500) -> dict:
     """
     Check for overdue invoices and send reminders.
+    Run via Celery beat (daily).
+    
+    Streams due invoices ordered by organization and enqueues one reminder
+    task per organization chunk. The reminder task stamps
+    last_reminder_sent_at with a single UPDATE per chunk after sending, so
+    each invoice is reminded at most once every
+    INVOICE_OVERDUE_REMINDER_INTERVAL_DAYS. Invoices of organizations
+    without a billing email are stamped without sending. Finally refreshes
+    the overdue totals on OrganizationBillingSummary.
     
+    Args:
+        chunk_size: Maximum invoices per reminder task and per UPDATE
+        
     Returns:
         dict: Count of processed invoices
     """
+    from datetime import timedelta
+    from itertools import groupby
+    from django.conf import settings
+    from django.db.models import Q
     from django.utils import timezone
-    from .models import Invoice
+    from .models import Invoice, OrganizationBillingSummary
     
-    # Find overdue unpaid invoices
-    overdue = Invoice.objects.filter(
+    now = timezone.now()
+    reminder_cutoff = now - timedelta(days=settings.INVOICE_OVERDUE_REMINDER_INTERVAL_DAYS)
+    
+    # Find overdue unpaid invoices not reminded within the interval
+    rows = Invoice.objects.filter(
         status='open',
         paid=False,
-        due_date__lt=timezone.now()
-    )
+        due_date__lt=now
+    ).filter(
+        Q(last_reminder_sent_at__isnull=True) | Q(last_reminder_sent_at__lt=reminder_cutoff)
+    ).order_by('organization_id', 'due_date').values_list(
+        'id',
+        'organization_id',
+        'organization__billing_email',
+        'invoice_number',
+        'total_amount_cents',
+        'amount_paid_cents',
+        'currency',
+        'due_date',
+    ).iterator(chunk_size=chunk_size)
+    
+    skipped = 0
+    warned = set()
+    
+    def flush(organization_id, billing_email, chunk):
+        nonlocal skipped
+        if billing_email:
+            send_overdue_reminders.delay(str(organization_id), billing_email, chunk)
+            return
+        # No address to remind: stamp anyway so these invoices are not
+        # re-selected by every sweep, and log once per organization
+        Invoice.objects.filter(
+            id__in=[item['id'] for item in chunk]
+        ).update(last_reminder_sent_at=now)
+        skipped += len(chunk)
+        if organization_id not in warned:
+            warned.add(organization_id)
+            logger.warning(f"No billing email for organization {organization_id}; overdue reminder skipped")
     
     count = 0
-    for invoice in overdue:
-        # Send reminder email
-        send_invoice_email.delay(str(invoice.id), template='overdue_reminder')
-        count += 1
+    organizations = 0
+    for organization_id, org_rows in groupby(rows, key=lambda row: row[1]):
+        organizations += 1
+        billing_email = None
+        chunk = []
+        for invoice_id, _, email, number, total, paid, currency, due_date in org_rows:
+            billing_email = email
+            chunk.append({
+                'id': str(invoice_id),
+                'invoice_number': number,
+                'amount_due_cents': max(0, (total or 0) - paid),
+                'currency': currency,
+                'due_date': due_date.isoformat(),
+            })
+            if len(chunk) >= chunk_size:
+                flush(organization_id, billing_email, chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            flush(organization_id, billing_email, chunk)
+            count += len(chunk)
+    
+    # Recompute overdue totals on the organization billing summaries
+    OrganizationBillingSummary.refresh_overdue(now)
+    
+    return {'processed': count, 'organizations': organizations, 'skipped_no_email': skipped}
+
+
+@shared_task(queue='low')
+def cleanup_expired_idempotency_records(batch_size: int = 5000, max_batches: int = 200) -> dict:
+    """
+    Delete expired idempotency records.
+    Run via Celery beat (hourly).
+    
+    Deletes in bounded batches (see IdempotencyRecord.cleanup_expired), so
+    the cost of each run tracks the rows expired since the last one rather
+    than the size of the table.
+    
+    Args:
+        batch_size: Rows deleted per statement
+        max_batches: Upper bound on batches per run
+        
+    Returns:
+        dict: Rows deleted and time taken
+    """
+    import time
+    from .models import IdempotencyRecord
+    
+    started = time.monotonic()
+    deleted = IdempotencyRecord.cleanup_expired(batch_size=batch_size, max_batches=max_batches)
+    duration = time.monotonic() - started
     
-    return {'processed': count}
+    logger.info(f"Deleted {deleted} expired idempotency records in {duration:.2f}s")
+    return {'deleted': deleted, 'duration_seconds': round(duration, 3)}
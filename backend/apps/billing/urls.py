@@ -4,11 +4,12 @@ Billing URL Configuration
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import InvoiceViewSet
+from .views import GSTReportViewSet, InvoiceViewSet
 
 # Router for ViewSets
 router = DefaultRouter()
 router.register(r'invoices', InvoiceViewSet, basename='invoice')
+router.register(r'reports/gst-f5', GSTReportViewSet, basename='gst-f5-report')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -4,18 +4,28 @@ API endpoints for invoice management
 """
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from django.db import transaction
+from django.http import StreamingHttpResponse
 
+from apps.core.idempotency import idempotent
 from apps.events.models import Event
 
+from apps.organizations.models import Organization, OrganizationMembership
+
 from .models import Invoice
+from .pagination import InvoicePagination
+from .reports import GSTF5Report
 from .serializers import (
     InvoiceSerializer,
+    InvoiceBulkCreateSerializer,
     InvoiceCreateSerializer,
     InvoiceUpdateSerializer,
+    GSTReportPeriodSerializer,
     MarkPaidSerializer,
 )
+from .services import InvoiceService, PDFService
 
 
 class InvoiceViewSet(viewsets.ModelViewSet):
@@ -25,28 +35,96 @@ class InvoiceViewSet(viewsets.ModelViewSet):
     Endpoints:
     - GET /invoices/ - List user's invoices
     - POST /invoices/ - Create invoice
+    - POST /invoices/bulk/ - Create invoices in bulk (billing runs)
     - GET /invoices/{id}/ - Get invoice details
     - POST /invoices/{id}/mark-paid/ - Mark invoice as paid
     - POST /invoices/{id}/void/ - Void invoice
+    
+    The list is page-number paginated; pass ?pagination=cursor for keyset
+    pagination on (created_at, id), where deep pages cost the same as
+    page one.
+    
+    Create, bulk and mark-paid honour an optional Idempotency-Key header.
+    Invoices cannot be deleted (they are tax documents and counted in the
+    organization's billing summary); void them instead.
     """
     serializer_class = InvoiceSerializer
     permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'put', 'patch', 'head', 'options']
+    pagination_class = InvoicePagination
     
     def get_queryset(self):
-        """Return invoices for user's organizations."""
+        """
+        Return invoices for user's organizations.
+        
+        Organization IDs are resolved first so the invoice query is a plain
+        organization_id IN (...) filter - no membership join and no DISTINCT.
+        """
+        org_ids = list(
+            OrganizationMembership.objects.filter(
+                user=self.request.user
+            ).values_list('organization_id', flat=True)
+        )
         return Invoice.objects.filter(
-            organization__memberships__user=self.request.user
-        ).select_related('organization', 'subscription').distinct()
+            organization_id__in=org_ids
+        ).select_related('organization', 'subscription')
     
     def get_serializer_class(self):
         """Return appropriate serializer based on action."""
         if self.action == 'create':
             return InvoiceCreateSerializer
+        if self.action == 'bulk':
+            return InvoiceBulkCreateSerializer
         if self.action in ['update', 'partial_update']:
             return InvoiceUpdateSerializer
         return InvoiceSerializer
     
+    @idempotent(required=False)
+    def create(self, request, *args, **kwargs):
+        """
+        Create an invoice.
+        
+        POST /invoices/
+        """
+        return super().create(request, *args, **kwargs)
+    
+    @action(detail=False, methods=['post'])
+    @idempotent(required=False)
+    def bulk(self, request):
+        """
+        Create many invoices in one request.
+        
+        POST /invoices/bulk/
+        
+        Body:
+        - invoices: list of invoices (organization_id, subtotal_cents, ...)
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        items = serializer.validated_data['invoices']
+        organizations = Organization.objects.in_bulk(
+            {item['organization_id'] for item in items}
+        )
+        
+        invoices = InvoiceService.create_invoices_bulk(
+            [
+                {
+                    **{key: value for key, value in item.items() if key != 'organization_id'},
+                    'organization': organizations[item['organization_id']],
+                }
+                for item in items
+            ],
+            user=request.user,
+        )
+        
+        return Response(
+            InvoiceSerializer(invoices, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
+    
     @action(detail=True, methods=['post'], url_path='mark-paid')
+    @idempotent(required=False)
     def mark_paid(self, request, pk=None):
         """
         Mark invoice as paid.
@@ -55,27 +133,31 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         """
         invoice = self.get_object()
         
-        if invoice.paid:
-            return Response(
-                {'error': 'Invoice is already paid.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         serializer = MarkPaidSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        invoice.mark_paid(
-            payment_intent_id=serializer.validated_data.get('payment_intent_id')
-        )
-        
-        # Log event
-        Event.log(
-            event_type='invoice.paid',
-            user_id=request.user.id,
-            organization_id=invoice.organization_id,
-            invoice_id=str(invoice.id),
-            amount_cents=invoice.total_amount_cents,
-        )
+        with transaction.atomic():
+            # Re-read under a row lock: a Stripe invoice.paid may have been
+            # applied since get_object()
+            invoice = self.get_queryset().select_for_update(of=('self',)).get(pk=invoice.pk)
+            if invoice.paid:
+                return Response(
+                    {'error': 'Invoice is already paid.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            invoice.mark_paid(
+                payment_intent_id=serializer.validated_data.get('payment_intent_id')
+            )
+            
+            # Log event
+            Event.log(
+                event_type='invoice.paid',
+                user_id=request.user.id,
+                organization_id=invoice.organization_id,
+                invoice_id=str(invoice.id),
+                amount_cents=invoice.total_amount_cents,
+            )
         
         return Response(InvoiceSerializer(invoice).data)
     
@@ -121,14 +203,55 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         """
         invoice = self.get_object()
         
-        if invoice.pdf_url:
-            return Response({'pdf_url': invoice.pdf_url})
+        if PDFService.is_current(invoice):
+            return Response({'pdf_url': PDFService.get_pdf_url(invoice)})
         
-        # Trigger PDF generation
-        from .tasks import generate_invoice_pdf
-        generate_invoice_pdf.delay(str(invoice.id))
+        # Trigger PDF generation (at most one queued render per invoice)
+        PDFService.request_invoice_pdf(invoice)
         
         return Response(
             {'message': 'PDF generation queued.'},
             status=status.HTTP_202_ACCEPTED
         )
+
+
+class GSTReportViewSet(viewsets.ViewSet):
+    """
+    IRAS GST F5 reporting (staff only).
+    
+    Endpoints:
+    - GET /reports/gst-f5/?year=&quarter= - F5 box totals for a quarter
+    - GET /reports/gst-f5/audit/?year=&quarter=&export=csv|ndjson - Line-level audit file
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get_report(self, request):
+        serializer = GSTReportPeriodSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        return GSTF5Report(data['year'], data['quarter']), data['export']
+    
+    def list(self, request):
+        """
+        Get F5 box totals.
+        
+        GET /reports/gst-f5/?year=2026&quarter=3
+        """
+        report, _ = self.get_report(request)
+        return Response(report.totals())
+    
+    @action(detail=False, methods=['get'])
+    def audit(self, request):
+        """
+        Stream the line-level audit file.
+        
+        GET /reports/gst-f5/audit/?year=2026&quarter=3&export=csv
+        """
+        report, export = self.get_report(request)
+        if export == 'ndjson':
+            response = StreamingHttpResponse(report.stream_ndjson(), content_type='application/x-ndjson')
+        else:
+            response = StreamingHttpResponse(report.stream_csv(), content_type='text/csv')
+        filename = f'gst-f5-{report.period}-audit.{export}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -16,6 +16,16 @@ class IdempotencyConflict(APIException):
     default_code = 'idempotency_conflict'
 
 
+class IdempotencyKeyMismatch(APIException):
+    """
+    Raised when an idempotency key is reused with a different request.
+    Returns 422 Unprocessable Entity status.
+    """
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'Idempotency key was already used with a different request.'
+    default_code = 'idempotency_key_mismatch'
+
+
 class IdempotencyKeyRequired(APIException):
     """
     Raised when an idempotency key is required but not provided.
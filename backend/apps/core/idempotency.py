@@ -0,0 +1,367 @@
+"""
+NexusCore Idempotency
+Idempotency-Key handling for DRF views (PRD-d-3)
+"""
+import functools
+import gzip
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import NoReverseMatch
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+try:
+    import zstandard
+except ImportError:  # Optional; gzip is used when unavailable
+    zstandard = None
+
+from .constants import IDEMPOTENCY_EXPIRY_HOURS, IDEMPOTENCY_KEY_HEADER
+from .exceptions import IdempotencyConflict, IdempotencyKeyMismatch, IdempotencyKeyRequired
+
+CACHE_KEY = 'idempotency:{digest}'
+MAX_KEY_LENGTH = 200
+REPLAY_HEADER = 'Idempotent-Replayed'
+
+# Canonical JSON: sorted keys, no insignificant whitespace
+_canonical_encoder = json.JSONEncoder(
+    sort_keys=True,
+    separators=(',', ':'),
+    ensure_ascii=False,
+    default=str,
+)
+
+
+def idempotent(view=None, *, required: bool = True, location=None):
+    """
+    Make a DRF view or action safe to retry with an Idempotency-Key header.
+    
+    The key is claimed atomically in Redis (SET NX) for a short processing
+    lease of IDEMPOTENCY_PROCESSING_LEASE_SECONDS, so a key held by a
+    request that died is released soon rather than after a day. Completed
+    responses are kept for IDEMPOTENCY_EXPIRY_HOURS. Retries of a completed
+    request are replayed straight from Redis without touching the database;
+    retries while the first request is still running get 409 Conflict.
+    IdempotencyRecord keeps a durable copy in case the cache entry is lost.
+    
+    Responses are stored rendered and compressed (see encode_response)
+    and replayed as raw bytes. Keys are scoped to the requesting user. Each
+    claim stores a fingerprint of the request (see request_fingerprint);
+    reusing a key for a different request gets 422 instead of someone
+    else's response. Responses with status 500 or above, and exceptions,
+    release the key so the client can retry.
+    
+    Usage:
+        @idempotent
+        def create(self, request, *args, **kwargs): ...
+        
+        @action(detail=True, methods=['post'])
+        @idempotent(required=False)
+        def mark_paid(self, request, pk=None): ...
+    
+    Args:
+        required: Reject requests without the header (400) instead of
+            running them unprotected
+        location: Optional callable(view, request, response) returning the
+            URL of a resource to redirect replays to (303 See Other) when
+            the response exceeds IDEMPOTENCY_RESPONSE_MAX_BYTES; defaults
+            to the detail URL of the returned object
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+            if not key:
+                if required:
+                    raise IdempotencyKeyRequired()
+                return func(self, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                raise ValidationError(
+                    {IDEMPOTENCY_KEY_HEADER: f'Must be at most {MAX_KEY_LENGTH} characters.'}
+                )
+            
+            claim = IdempotencyClaim(request, key)
+            replay = claim.acquire()
+            if replay is not None:
+                return replay
+            
+            try:
+                response = func(self, request, *args, **kwargs)
+            except Exception:
+                claim.release()
+                raise
+            
+            if response.status_code >= 500:
+                claim.release()
+            else:
+                claim.complete(encode_response(self, request, response, location))
+            return response
+        
+        return wrapper
+    
+    if view is not None:
+        return decorator(view)
+    return decorator
+
+
+# IdempotencyRecord fields describing a stored response
+STORED_FIELDS = (
+    'response_status_code',
+    'response_data',
+    'response_encoding',
+    'response_content_type',
+    'response_location',
+    'response_body',
+)
+
+
+class IdempotencyClaim:
+    """One request's hold on an idempotency key."""
+    
+    def __init__(self, request, key: str):
+        user_id = getattr(request.user, 'pk', None) or 'anonymous'
+        self.request = request
+        self.key = f'{user_id}:{key}'
+        self.cache_key = CACHE_KEY.format(digest=hashlib.sha256(self.key.encode()).hexdigest())
+        self.ttl = timedelta(hours=IDEMPOTENCY_EXPIRY_HOURS)
+        self.lease = timedelta(seconds=settings.IDEMPOTENCY_PROCESSING_LEASE_SECONDS)
+        self.request_hash = request_fingerprint(request)
+        self.record = None
+    
+    def acquire(self):
+        """
+        Claim the key.
+        
+        Returns:
+            Response to replay, or None if this request now owns the key
+        
+        Raises:
+            IdempotencyConflict: The key is held by a request in progress
+            IdempotencyKeyMismatch: The key was used for a different request
+        """
+        timeout = int(self.lease.total_seconds())
+        entry = {'status': 'processing', 'request_hash': self.request_hash}
+        added = cache.add(self.cache_key, entry, timeout=timeout)
+        if not added:
+            entry = cache.get(self.cache_key)
+            if entry is not None:
+                self._check_fingerprint(entry.get('request_hash'))
+                if entry['status'] == 'completed':
+                    return replay_response(self.request, entry)
+                raise IdempotencyConflict()
+            # Entry expired between add() and get(); fall back to the database
+        
+        try:
+            return self._claim_record()
+        except Exception:
+            if added:
+                # The key belongs to another request (or the claim failed):
+                # don't leave our fingerprint holding it for the lease
+                cache.delete(self.cache_key)
+            raise
+    
+    def _claim_record(self):
+        """Persist the claim, honouring a record that outlived its cache entry."""
+        from apps.billing.models import IdempotencyRecord
+        
+        record, claimed = IdempotencyRecord.claim(
+            key=self.key,
+            request_path=self.request.path,
+            request_method=self.request.method,
+            request_hash=self.request_hash,
+            expires_at=timezone.now() + self.lease,
+        )
+        if not claimed:
+            self._check_fingerprint(record.request_hash)
+            if record.can_be_replayed():
+                stored = {field: getattr(record, field) for field in STORED_FIELDS}
+                if record.response_data is not None:
+                    stored['response_data'] = bytes(record.response_data)
+                # Also replaces the processing entry acquire() may have added
+                self._cache_response(stored)
+                return replay_response(self.request, stored)
+            raise IdempotencyConflict()
+        
+        self.record = record
+        return None
+    
+    def complete(self, stored: dict) -> None:
+        """
+        Store an encoded response (see encode_response) for replay.
+        
+        The processing lease is extended to the full retention period only
+        now. If the lease ran out and a retry took the key over, the retry's
+        claim is left alone.
+        """
+        if self._update_record(status='completed', expires_at=timezone.now() + self.ttl, **stored):
+            self._cache_response(stored)
+    
+    def release(self) -> None:
+        """Give the key back after a failure so the client can retry."""
+        if self._update_record(status='failed'):
+            cache.delete(self.cache_key)
+    
+    def _update_record(self, **fields) -> bool:
+        """Update our claim; False if it has since been taken over (or cleaned up)."""
+        from apps.billing.models import IdempotencyRecord
+        
+        return IdempotencyRecord.objects.filter(
+            id=self.record.id, status='processing'
+        ).update(updated_at=timezone.now(), **fields) > 0
+    
+    def _cache_response(self, stored: dict) -> None:
+        cache.set(
+            self.cache_key,
+            {'status': 'completed', 'request_hash': self.request_hash, **stored},
+            timeout=int(self.ttl.total_seconds()),
+        )
+    
+    def _check_fingerprint(self, request_hash: str) -> None:
+        # Records claimed before fingerprinting have no hash to compare
+        if request_hash and request_hash != self.request_hash:
+            raise IdempotencyKeyMismatch()
+
+
+
+def request_fingerprint(request) -> str:
+    """
+    SHA-256 of the request method, path and canonicalized body.
+    
+    Uses the body DRF has already parsed (the view needs it anyway), so the
+    raw stream is never re-read. JSON is encoded incrementally with sorted
+    keys straight into the hash, so key order and whitespace don't change
+    the fingerprint and no canonical copy of the body is built. Uploaded
+    files contribute their name, size and type rather than their content.
+    """
+    digest = hashlib.sha256()
+    digest.update(f'{request.method} {request.path}\n'.encode())
+    
+    data = request.data
+    if hasattr(data, 'lists'):
+        # Form / multipart QueryDict
+        data = {key: values for key, values in data.lists()}
+    for field, upload in getattr(request, 'FILES', {}).items():
+        data[field] = [upload.name, upload.size, upload.content_type]
+    
+    for chunk in _canonical_encoder.iterencode(data):
+        digest.update(chunk.encode())
+    return digest.hexdigest()
+
+
+def encode_response(view, request, response, location=None) -> dict:
+    """
+    Render a view's response into the stored (and cached) replay form.
+    
+    The body is rendered to JSON once and compressed with
+    IDEMPOTENCY_RESPONSE_COMPRESSION (gzip, or zstd when the zstandard
+    package is installed) when larger than
+    IDEMPOTENCY_RESPONSE_COMPRESS_MIN_BYTES. Bodies still larger than
+    IDEMPOTENCY_RESPONSE_MAX_BYTES are replaced by the URL of a resource
+    the client can re-fetch (replayed as 303 See Other) when there is one;
+    otherwise (e.g. bulk list responses) the body is stored regardless, so
+    a replay never returns an empty body.
+    
+    Returns:
+        dict: IdempotencyRecord response field values
+    """
+    data = JSONRenderer().render(response.data) if response.data is not None else b''
+    encoding = 'identity'
+    
+    codec = settings.IDEMPOTENCY_RESPONSE_COMPRESSION
+    if codec != 'none' and len(data) >= settings.IDEMPOTENCY_RESPONSE_COMPRESS_MIN_BYTES:
+        if codec == 'zstd' and zstandard is not None:
+            data, encoding = zstandard.ZstdCompressor().compress(data), 'zstd'
+        else:
+            data, encoding = gzip.compress(data, compresslevel=6, mtime=0), 'gzip'
+    
+    reference = ''
+    if len(data) > settings.IDEMPOTENCY_RESPONSE_MAX_BYTES:
+        reference = (location or _detail_location)(view, request, response) or ''
+        if reference:
+            data, encoding = b'', 'identity'
+    
+    return {
+        'response_status_code': response.status_code,
+        'response_data': data,
+        'response_encoding': encoding,
+        'response_content_type': 'application/json',
+        'response_location': reference,
+        'response_body': None,
+    }
+
+
+def replay_response(request, stored: dict) -> HttpResponse:
+    """
+    Build a replay from stored response fields without re-serializing.
+    
+    Compressed bodies are sent as-is when the client accepts the encoding
+    and only decompressed otherwise.
+    """
+    if stored.get('response_location'):
+        response = HttpResponse(status=303)
+        response['Location'] = stored['response_location']
+    elif stored.get('response_data') is None:
+        # Stored before responses were encoded
+        response = Response(stored.get('response_body'), status=stored['response_status_code'])
+    else:
+        data = stored['response_data']
+        encoding = stored.get('response_encoding') or 'identity'
+        response = HttpResponse(
+            status=stored['response_status_code'],
+            content_type=stored.get('response_content_type') or 'application/json',
+        )
+        if encoding != 'identity':
+            response['Vary'] = 'Accept-Encoding'
+            if _accepts_encoding(request.headers.get('Accept-Encoding', ''), encoding):
+                response['Content-Encoding'] = encoding
+            elif encoding == 'zstd':
+                data = zstandard.ZstdDecompressor().decompress(data)
+            else:
+                data = gzip.decompress(data)
+        response.content = data
+    
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def _detail_location(view, request, response):
+    """Detail URL of the object a view returned, if it has one."""
+    data = response.data
+    if not isinstance(data, dict) or 'id' not in data:
+        return None
+    try:
+        return view.reverse_action('detail', args=[data['id']])
+    except (AttributeError, NoReverseMatch):
+        return None
+
+
+def _accepts_encoding(header: str, encoding: str) -> bool:
+    """
+    Whether an Accept-Encoding header allows a content coding.
+    
+    Honours q-values (q=0 refuses a coding) and the '*' wildcard; an
+    explicit entry for the coding takes precedence over '*'.
+    """
+    wildcard = None
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        coding = coding.lower()
+        if coding == encoding:
+            return quality > 0
+        if coding == '*':
+            wildcard = quality > 0
+    return bool(wildcard)
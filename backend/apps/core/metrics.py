@@ -0,0 +1,215 @@
+"""
+NexusCore Metrics
+Histograms and counters shared across web and worker processes
+"""
+import hmac
+import logging
+from typing import Iterable
+
+from django.conf import settings
+from django.http import HttpResponse
+from redis.exceptions import RedisError
+
+try:
+    from opentelemetry import metrics as otel_metrics
+except ImportError:  # Optional; Redis aggregation works without it
+    otel_metrics = None
+
+from .redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY = 'metrics:{name}'
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 10)
+
+_registry = {}
+
+
+class Metric:
+    """
+    Base for metrics aggregated in one Redis hash per metric.
+    
+    Web and Celery processes all write to the same hash, so /metrics
+    reports totals across the deployment rather than one process. When
+    the OpenTelemetry API is installed, observations are also recorded on
+    an OTel instrument, exported by whatever SDK the deployment configures.
+    Metrics must never break the code they measure: Redis errors are
+    logged and dropped.
+    """
+    
+    kind = ''
+    
+    def __init__(self, name: str, description: str, unit: str = ''):
+        self.name = name
+        self.description = description
+        self.unit = unit
+        self.key = KEY.format(name=name)
+        self.instrument = None
+        if otel_metrics is not None:
+            self.instrument = self.create_instrument(otel_metrics.get_meter('nexuscore'))
+        _registry[name] = self
+    
+    def create_instrument(self, meter):
+        raise NotImplementedError
+    
+    def record(self, observations: Iterable[tuple]) -> None:
+        """
+        Record (value, labels) pairs in a single Redis round trip.
+        
+        Args:
+            observations: (value, labels dict) pairs
+        """
+        record_all([(self, observations)])
+    
+    def otel_record(self, value, labels: dict) -> None:
+        raise NotImplementedError
+    
+    def redis_record(self, pipe, value, labels: str) -> None:
+        raise NotImplementedError
+    
+    def render(self, data: dict) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonic count, e.g. events by outcome."""
+    
+    kind = 'counter'
+    
+    def create_instrument(self, meter):
+        return meter.create_counter(self.name, unit=self.unit, description=self.description)
+    
+    def inc(self, amount: int = 1, **labels) -> None:
+        self.record([(amount, labels)])
+    
+    def otel_record(self, value, labels: dict) -> None:
+        self.instrument.add(value, labels)
+    
+    def redis_record(self, pipe, value, labels: str) -> None:
+        pipe.hincrby(self.key, labels, value)
+    
+    def render(self, data: dict) -> list[str]:
+        return [
+            f'{self.name}{{{labels}}} {int(value)}' if labels else f'{self.name} {int(value)}'
+            for labels, value in sorted(data.items())
+        ]
+
+
+class Histogram(Metric):
+    """
+    Distribution of values in fixed buckets, e.g. latencies in seconds.
+    
+    Each observation increments only its own bucket (plus sum and count),
+    so it costs three hash increments; buckets are made cumulative when
+    rendered.
+    """
+    
+    kind = 'histogram'
+    
+    def __init__(self, name: str, description: str, unit: str = 's', buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, description, unit)
+    
+    def create_instrument(self, meter):
+        return meter.create_histogram(self.name, unit=self.unit, description=self.description)
+    
+    def observe(self, value: float, **labels) -> None:
+        self.record([(value, labels)])
+    
+    def otel_record(self, value, labels: dict) -> None:
+        self.instrument.record(value, labels)
+    
+    def redis_record(self, pipe, value, labels: str) -> None:
+        bucket = next((str(bound) for bound in self.buckets if value <= bound), '+Inf')
+        pipe.hincrby(self.key, f'{labels}\x1f{bucket}', 1)
+        pipe.hincrbyfloat(self.key, f'{labels}\x1fsum', value)
+        pipe.hincrby(self.key, f'{labels}\x1fcount', 1)
+    
+    def render(self, data: dict) -> list[str]:
+        series = {}
+        for field, value in data.items():
+            labels, _, part = field.rpartition('\x1f')
+            series.setdefault(labels, {})[part] = float(value)
+        
+        lines = []
+        for labels, parts in sorted(series.items()):
+            prefix = f'{labels},' if labels else ''
+            cumulative = 0
+            for bound in (*map(str, self.buckets), '+Inf'):
+                cumulative += parts.get(bound, 0)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {int(cumulative)}')
+            suffix = f'{{{labels}}}' if labels else ''
+            lines.append(f'{self.name}_sum{suffix} {parts.get("sum", 0):g}')
+            lines.append(f'{self.name}_count{suffix} {int(parts.get("count", 0))}')
+        return lines
+
+
+def record_all(batches: Iterable[tuple]) -> None:
+    """
+    Record observations for several metrics in a single Redis round trip.
+    
+    Args:
+        batches: (metric, [(value, labels dict), ...]) pairs
+    """
+    if not settings.METRICS_ENABLED:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for metric, observations in batches:
+            for value, labels in observations:
+                if metric.instrument is not None:
+                    metric.otel_record(value, labels)
+                metric.redis_record(pipe, value, _label_string(labels))
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Dropped metric observations: {e}")
+
+
+def render_prometheus() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    metrics = list(_registry.values())
+    pipe = get_redis().pipeline(transaction=False)
+    for metric in metrics:
+        pipe.hgetall(metric.key)
+    
+    lines = []
+    for metric, raw in zip(metrics, pipe.execute()):
+        data = {field.decode(): value.decode() for field, value in raw.items()}
+        lines.append(f'# HELP {metric.name} {metric.description}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.render(data))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint.
+    
+    Requires `Authorization: Bearer <METRICS_TOKEN>`. Without a token the
+    endpoint is only served when DEBUG is on. Returns 503 while Redis is
+    unavailable.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return HttpResponse(status=401)
+    elif not settings.DEBUG:
+        return HttpResponse(status=404)
+    
+    try:
+        body = render_prometheus()
+    except RedisError as e:
+        logger.warning(f"Metrics unavailable: {e}")
+        return HttpResponse(status=503)
+    return HttpResponse(body, content_type='text/plain; version=0.0.4')
+
+
+def _label_string(labels: dict) -> str:
+    """Render labels as Prometheus label pairs (sorted, escaped)."""
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
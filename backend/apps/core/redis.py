@@ -0,0 +1,21 @@
+"""
+NexusCore Redis Access
+Shared client for Redis data structures beyond the cache API
+"""
+import redis
+from django.conf import settings
+
+_client = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Process-wide Redis client for REDIS_URL.
+    
+    redis-py pools connections per client, so sharing one instance keeps
+    the number of sockets per worker bounded.
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
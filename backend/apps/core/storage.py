@@ -0,0 +1,84 @@
+"""
+NexusCore File Uploads
+Streaming uploads through the configured STORAGES backends
+"""
+import io
+from typing import IO, Iterable, Union
+
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import storages
+
+# Read-ahead buffer for generator uploads; S3 multipart parts are cut from it
+STREAM_BUFFER_SIZE = 1024 * 1024
+
+UploadContent = Union[bytes, bytearray, memoryview, IO[bytes], Iterable[bytes]]
+
+
+class IterableStream(io.RawIOBase):
+    """
+    Read-only, non-seekable stream over an iterable of byte chunks.
+    
+    Lets a generator (e.g. a ZIP or NDJSON writer) be uploaded without
+    ever holding the whole file in memory.
+    """
+    
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._view = memoryview(b'')
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        while not self._view:
+            try:
+                self._view = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._view))
+        buffer[:size] = self._view[:size]
+        self._view = self._view[size:]
+        return size
+
+
+def upload_file(
+    name: str,
+    content: UploadContent,
+    storage: str = 'default',
+    content_type: str = None,
+) -> str:
+    """
+    Upload content to a configured storage backend.
+    
+    The backend is resolved from STORAGES, so production uses S3 while
+    development and tests can swap in FileSystemStorage or InMemoryStorage
+    without code changes. S3 storages share one pooled client per worker
+    thread and switch to concurrent multipart uploads above
+    AWS_S3_MULTIPART_THRESHOLD (see AWS_S3_TRANSFER_CONFIG).
+    
+    Args:
+        name: Path within the storage
+        content: Bytes, a binary file object, or an iterable of byte chunks
+        storage: STORAGES alias
+        content_type: Optional MIME type (guessed from name otherwise)
+    
+    Returns:
+        str: The name the file was stored under
+    """
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        file = ContentFile(bytes(content), name=name)
+    elif hasattr(content, 'read'):
+        file = File(content, name=name)
+    else:
+        stream = io.BufferedReader(IterableStream(content), buffer_size=STREAM_BUFFER_SIZE)
+        file = File(stream, name=name)
+    
+    if content_type:
+        file.content_type = content_type
+    
+    return storages[storage].save(name, file)
+
+
+def file_url(name: str, storage: str = 'default') -> str:
+    """URL for a stored file (signed when the backend uses query auth)."""
+    return storages[storage].url(name)
@@ -4,6 +4,7 @@ Audit logging for all mutations (PRD-d-3)
 """
 import uuid
 from django.db import models
+from django.utils import timezone
 
 
 class Event(models.Model):
@@ -56,8 +57,9 @@ class Event(models.Model):
         help_text='Event payload data'
     )
     
-    # Timestamp
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Timestamp (set when the event is logged, not when the buffered
+    # batch is inserted)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         db_table = 'events'
@@ -74,18 +76,37 @@ class Event(models.Model):
         return f"Event: {self.event_type} at {self.created_at}"
     
     @classmethod
-    def log(cls, event_type: str, user=None, organization=None, **data):
+    def log(
+        cls,
+        event_type: str,
+        user=None,
+        organization=None,
+        user_id=None,
+        organization_id=None,
+        **data
+    ):
         """
-        Convenience method to create an event.
+        Convenience method to record an event.
+        
+        The event is written after the current transaction commits, in a
+        batch (see apps.events.writer), so it adds no insert to the request
+        and is dropped if the transaction rolls back.
         
         Usage:
             Event.log('user.created', user=user, email=user.email)
             Event.log('subscription.activated', organization=org, plan_id=plan.id)
+            Event.log('invoice.paid', user_id=user.id, organization_id=org_id)
+        
+        Returns:
+            Event: The (not yet saved) event
         """
         import uuid as uuid_module
+        from .writer import get_writer
         
-        user_id = getattr(user, 'id', None) if user else None
-        org_id = getattr(organization, 'id', None) if organization else None
+        if user is not None:
+            user_id = getattr(user, 'id', None)
+        if organization is not None:
+            organization_id = getattr(organization, 'id', None)
         
         # Convert any UUID values in data to strings for JSON serialization
         serialized_data = {}
@@ -95,9 +116,22 @@ class Event(models.Model):
             else:
                 serialized_data[key] = value
         
-        return cls.objects.create(
+        event = cls(
             event_type=event_type,
             user_id=user_id,
-            organization_id=org_id,
+            organization_id=organization_id,
             data=serialized_data
         )
+        get_writer().emit([event])
+        return event
+    
+    def to_dict(self) -> dict:
+        """JSON-serializable form for handing events to a Celery task."""
+        return {
+            'id': str(self.id),
+            'event_type': self.event_type,
+            'user_id': str(self.user_id) if self.user_id else None,
+            'organization_id': str(self.organization_id) if self.organization_id else None,
+            'data': self.data,
+            'created_at': self.created_at.isoformat(),
+        }
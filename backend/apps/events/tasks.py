@@ -0,0 +1,44 @@
+"""
+Event Celery Tasks
+Background writes for the audit event log
+"""
+import logging
+from celery import shared_task
+from django.db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(
+    queue='low',
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    retry_backoff_max=600,
+    max_retries=20,
+)
+def write_events(events: list[dict]) -> dict:
+    """
+    Insert a batch of audit events handed off by the event writer.
+    
+    Event IDs are assigned when the events are logged, so a redelivered
+    or retried task does not insert duplicates. Database errors are
+    retried with exponential backoff (up to about two hours), so a
+    transient outage does not lose audit records.
+    
+    Args:
+        events: Event.to_dict() values
+    
+    Returns:
+        dict: Number of events written
+    """
+    from django.utils.dateparse import parse_datetime
+    from .models import Event
+    
+    Event.objects.bulk_create(
+        [
+            Event(**{**event, 'created_at': parse_datetime(event['created_at'])})
+            for event in events
+        ],
+        ignore_conflicts=True,
+    )
+    return {'written': len(events)}
@@ -0,0 +1,150 @@
+"""
+Event Writer
+Buffered, commit-aware audit event writes
+"""
+import atexit
+import logging
+import threading
+import time
+
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Failed batches kept in memory for the next flush, in units of
+# EVENT_LOG_BATCH_SIZE, while neither the database nor Celery is reachable
+MAX_RETAINED_BATCHES = 10
+
+
+class EventWriter:
+    """
+    Per-process buffer of audit events written in batches.
+    
+    Events are only handed to the writer once the transaction that
+    produced them commits (transaction.on_commit), so rolled-back
+    mutations never emit events and audit inserts no longer run inside,
+    or lengthen, the request's transaction. The buffer is flushed when it
+    reaches EVENT_LOG_BATCH_SIZE or EVENT_LOG_FLUSH_INTERVAL_MS after the
+    first buffered event (from a timer thread), and at process exit.
+    
+    EVENT_LOG_MODE selects how a batch is written:
+    - 'buffer': one bulk_create from this process
+    - 'celery': handed to the low-queue write_events task
+    - 'sync': no buffering; each event is inserted on commit
+    
+    A batch whose insert fails is handed to the write_events task, which
+    retries with backoff; if that hand-off fails too (broker down), the
+    batch is kept and retried on the next flush, up to
+    MAX_RETAINED_BATCHES batches. Events still buffered when a process is
+    killed outright are lost; use 'celery' or 'sync' where that matters
+    more than request latency.
+    """
+    
+    def __init__(self):
+        self._events = []
+        self._lock = threading.Lock()
+        self._timer = None
+    
+    def emit(self, events: list) -> None:
+        """Queue unsaved Event instances to be written after commit."""
+        if events:
+            transaction.on_commit(lambda: self._add(events))
+    
+    def _add(self, events: list) -> None:
+        if settings.EVENT_LOG_MODE == 'sync':
+            self._write(events)
+            return
+        
+        with self._lock:
+            self._events.extend(events)
+            full = len(self._events) >= settings.EVENT_LOG_BATCH_SIZE
+            if not full:
+                self._start_timer()
+        if full:
+            self.flush()
+    
+    def _start_timer(self) -> None:
+        # Caller holds self._lock
+        if self._timer is None:
+            self._timer = threading.Timer(
+                settings.EVENT_LOG_FLUSH_INTERVAL_MS / 1000, self._flush_from_timer
+            )
+            self._timer.daemon = True
+            self._timer.start()
+    
+    def flush(self) -> int:
+        """
+        Write everything buffered so far.
+        
+        Returns:
+            int: Number of events written
+        """
+        with self._lock:
+            events, self._events = self._events, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if events:
+            self._write(events)
+        return len(events)
+    
+    def _flush_from_timer(self) -> None:
+        try:
+            self.flush()
+        finally:
+            # The timer thread has its own database connection
+            connections.close_all()
+    
+    def _write(self, events: list) -> None:
+        from .models import Event
+        
+        started = time.monotonic()
+        try:
+            if settings.EVENT_LOG_MODE == 'celery':
+                self._hand_off(events)
+            else:
+                try:
+                    # Event IDs are assigned when logged, so a retried batch
+                    # never inserts duplicates
+                    Event.objects.bulk_create(
+                        events, batch_size=settings.EVENT_LOG_BATCH_SIZE, ignore_conflicts=True
+                    )
+                except DatabaseError as e:
+                    logger.warning(f"Audit event insert failed, handing {len(events)} events to Celery: {e}")
+                    self._hand_off(events)
+        except Exception:
+            # Audit writes must never fail the mutation that already committed
+            logger.exception(f"Failed to write {len(events)} audit events; keeping them for the next flush")
+            self._retain(events)
+            return
+        logger.debug(f"Wrote {len(events)} audit events in {time.monotonic() - started:.3f}s")
+    
+    @staticmethod
+    def _hand_off(events: list) -> None:
+        from .tasks import write_events
+        
+        write_events.delay([event.to_dict() for event in events])
+    
+    def _retain(self, events: list) -> None:
+        """Put a failed batch back at the head of the buffer, within the bound."""
+        with self._lock:
+            room = settings.EVENT_LOG_BATCH_SIZE * MAX_RETAINED_BATCHES - len(self._events)
+            kept = events[:max(room, 0)]
+            self._events[:0] = kept
+            if self._events:
+                self._start_timer()
+        if len(kept) < len(events):
+            logger.error(f"Audit event buffer full; dropped {len(events) - len(kept)} events")
+
+
+_writer = EventWriter()
+atexit.register(_writer.flush)
+# Prefork Celery children exit without running atexit handlers
+worker_process_shutdown.connect(lambda **kwargs: _writer.flush(), weak=False)
+
+
+def get_writer() -> EventWriter:
+    """Process-wide event writer."""
+    return _writer
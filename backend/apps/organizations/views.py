@@ -9,6 +9,9 @@ from rest_framework.response import Response
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 
+from apps.billing.models import OrganizationBillingSummary
+from apps.billing.serializers import OrganizationBillingSummarySerializer
+
 from .models import Organization, OrganizationMembership
 from .serializers import (
     OrganizationSerializer,
@@ -35,6 +38,7 @@ class OrganizationViewSet(viewsets.ModelViewSet):
     - GET /organizations/{id}/members/ - List members
     - POST /organizations/{id}/invite/ - Invite member
     - POST /organizations/{id}/remove-member/ - Remove member
+    - GET /organizations/{id}/billing-summary/ - Invoice totals
     """
     permission_classes = [IsAuthenticated]
     
@@ -72,6 +76,23 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         serializer = OrganizationMembershipSerializer(memberships, many=True)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'], url_path='billing-summary')
+    def billing_summary(self, request, pk=None):
+        """
+        Get the organization's invoice totals.
+        
+        GET /organizations/{id}/billing-summary/
+        
+        Reads the maintained OrganizationBillingSummary row; organizations
+        without invoices get zero totals.
+        """
+        org = self.get_object()
+        summary = (
+            OrganizationBillingSummary.objects.filter(organization=org).first()
+            or OrganizationBillingSummary(organization=org)
+        )
+        return Response(OrganizationBillingSummarySerializer(summary).data)
+    
     @action(detail=True, methods=['post'])
     def invite(self, request, pk=None):
         """
@@ -9,8 +9,7 @@ from rest_framework.response import Response
 from django.db import transaction
 from django.utils import timezone
 
-from apps.billing.models import IdempotencyRecord
-from apps.core.exceptions import IdempotencyConflict
+from apps.core.idempotency import idempotent
 from apps.events.models import Event
 
 from .models import Plan, Subscription
@@ -64,6 +63,7 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
             return SubscriptionCreateSerializer
         return SubscriptionSerializer
     
+    @idempotent
     @transaction.atomic
     def create(self, request, *args, **kwargs):
         """
@@ -71,71 +71,27 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
         
         CRITICAL: Requires Idempotency-Key header.
         """
-        # Check idempotency key
-        idempotency_key = request.headers.get('Idempotency-Key')
-        if not idempotency_key:
-            return Response(
-                {'error': 'Idempotency-Key header is required'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # Validate request
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
         
-        # Check for existing idempotency record
-        existing = IdempotencyRecord.objects.filter(key=idempotency_key).first()
-        if existing:
-            if existing.can_be_replayed():
-                return Response(
-                    existing.response_body,
-                    status=existing.response_status_code
-                )
-            raise IdempotencyConflict(
-                f"Request with idempotency key '{idempotency_key}' is still processing"
-            )
+        # Create subscription via service
+        subscription = SubscriptionService.create_subscription(
+            organization_id=serializer.validated_data['organization_id'],
+            plan_id=serializer.validated_data['plan_id'],
+            user=request.user
+        )
         
-        # Create idempotency record
-        idempotency_record = IdempotencyRecord.objects.create(
-            key=idempotency_key,
-            request_path=request.path,
-            request_method=request.method,
-            status='processing'
+        # Log event
+        Event.log(
+            event_type='subscription.created',
+            user_id=request.user.id,
+            organization_id=subscription.organization_id,
+            plan_id=str(subscription.plan_id),
+            subscription_id=str(subscription.id),
         )
         
-        try:
-            # Validate request
-            serializer = self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            
-            # Create subscription via service
-            subscription = SubscriptionService.create_subscription(
-                organization_id=serializer.validated_data['organization_id'],
-                plan_id=serializer.validated_data['plan_id'],
-                user=request.user
-            )
-            
-            # Log event
-            Event.log(
-                event_type='subscription.created',
-                user_id=request.user.id,
-                organization_id=subscription.organization_id,
-                plan_id=str(subscription.plan_id),
-                subscription_id=str(subscription.id),
-            )
-            
-            # Prepare response
-            response_data = SubscriptionSerializer(subscription).data
-            
-            # Update idempotency record
-            idempotency_record.status = 'completed'
-            idempotency_record.response_status_code = 201
-            idempotency_record.response_body = response_data
-            idempotency_record.save()
-            
-            return Response(response_data, status=status.HTTP_201_CREATED)
-            
-        except Exception as e:
-            # Mark idempotency record as failed
-            idempotency_record.status = 'failed'
-            idempotency_record.save()
-            raise
+        return Response(SubscriptionSerializer(subscription).data, status=status.HTTP_201_CREATED)
     
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
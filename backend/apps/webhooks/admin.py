@@ -2,6 +2,8 @@
 Webhook Admin Configuration
 Django admin for WebhookEvent model
 """
+import json
+
 from django.contrib import admin
 from django.utils.html import format_html
 
@@ -16,6 +18,8 @@ class WebhookEventAdmin(admin.ModelAdmin):
         'event_id_short',
         'service',
         'event_type',
+        'object_id',
+        'object_status',
         'processed_badge',
         'retry_count',
         'created_at',
@@ -24,18 +28,31 @@ class WebhookEventAdmin(admin.ModelAdmin):
     list_filter = [
         'service',
         'processed',
+        'dead_lettered_at',
         'event_type',
         'created_at',
     ]
     search_fields = [
         'event_id',
         'event_type',
+        'object_id',
     ]
     ordering = ['-created_at']
     readonly_fields = [
         'id',
         'event_id',
-        'payload',
+        'object_id',
+        'event_created',
+        'object_status',
+        'payment_intent_id',
+        'period_start',
+        'period_end',
+        'failure_message',
+        'payload_display',
+        'last_retry_at',
+        'next_attempt_at',
+        'due_at',
+        'dead_lettered_at',
         'created_at',
         'processed_at',
     ]
@@ -44,15 +61,36 @@ class WebhookEventAdmin(admin.ModelAdmin):
         (None, {
             'fields': ('id', 'service', 'event_id', 'event_type', 'processed')
         }),
+        ('Object', {
+            'fields': (
+                'object_id', 'event_created', 'object_status', 'payment_intent_id',
+                'period_start', 'period_end', 'failure_message',
+            )
+        }),
         ('Processing', {
-            'fields': ('retry_count', 'processing_error', 'created_at', 'processed_at')
+            'fields': (
+                'retry_count', 'processing_error', 'last_retry_at', 'next_attempt_at',
+                'due_at', 'dead_lettered_at', 'created_at', 'processed_at',
+            )
         }),
         ('Payload', {
-            'fields': ('payload',),
+            'fields': ('payload_display',),
             'classes': ('collapse',)
         }),
     )
     
+    def get_queryset(self, request):
+        """Lists only show projection columns; never load full payloads."""
+        return super().get_queryset(request).defer(*WebhookEvent.PAYLOAD_FIELDS)
+    
+    def payload_display(self, obj):
+        """Show the full payload (decompressed on demand)."""
+        return format_html(
+            '<pre style="white-space: pre-wrap;">{}</pre>',
+            json.dumps(obj.get_payload(), indent=2, sort_keys=True)
+        )
+    payload_display.short_description = 'Payload'
+    
     def event_id_short(self, obj):
         """Show truncated event ID."""
         if obj.event_id:
@@ -64,21 +102,51 @@ class WebhookEventAdmin(admin.ModelAdmin):
         """Display processed status as colored badge."""
         if obj.processed:
             return format_html('<span style="color: green;">✓ Processed</span>')
+        elif obj.dead_lettered_at:
+            return format_html('<span style="color: red;">✗ Dead-lettered</span>')
         else:
             return format_html('<span style="color: orange;">Pending</span>')
     processed_badge.short_description = 'Status'
     
-    actions = ['retry_failed']
+    actions = ['retry_failed', 'replay_dead_lettered']
     
     @admin.action(description='Retry failed webhook events')
     def retry_failed(self, request, queryset):
-        """Retry failed webhook events."""
-        from .tasks import process_stripe_webhook
+        """Queue pending events now, each through its own provider."""
+        from collections import defaultdict
+        from .providers import get_provider
+        
+        event_ids = defaultdict(list)
+        for event_id, service in queryset.filter(
+            processed=False, dead_lettered_at__isnull=True
+        ).values_list('id', 'service'):
+            event_ids[service].append(event_id)
         
         retried = 0
-        for event in queryset.filter(processed=False, service='stripe'):
-            process_stripe_webhook.delay(str(event.id))
-            retried += 1
+        for service, ids in event_ids.items():
+            provider = get_provider(service)
+            if provider is None:
+                continue
+            provider.enqueue(ids)
+            retried += len(ids)
         
         self.message_user(request, f'{retried} webhook event(s) queued for retry.')
-
+    
+    @admin.action(description='Replay dead-lettered webhook events')
+    def replay_dead_lettered(self, request, queryset):
+        """
+        Return dead-lettered events to the queue with a fresh retry budget.
+        
+        They are made due now, so the next retry sweep routes each one
+        through its own provider's enqueue.
+        """
+        from django.utils import timezone
+        
+        replayed = queryset.filter(processed=False, dead_lettered_at__isnull=False).update(
+            dead_lettered_at=None,
+            next_attempt_at=timezone.now(),
+            retry_count=0,
+            processing_error='',
+        )
+        
+        self.message_user(request, f'{replayed} webhook event(s) queued for replay.')
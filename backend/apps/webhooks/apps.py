@@ -10,3 +10,14 @@ class WebhooksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.webhooks'
     verbose_name = 'Webhooks'
+    
+    def ready(self):
+        """Register webhook providers and metrics."""
+        import apps.webhooks.metrics  # noqa: F401
+        from .handlers.sendgrid import SendGridProvider
+        from .handlers.stripe import StripeProvider
+        from .providers import register
+        
+        # Dispatch tables are resolved here, once per process
+        register(StripeProvider())
+        register(SendGridProvider())
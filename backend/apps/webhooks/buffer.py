@@ -0,0 +1,113 @@
+"""
+Webhook Ingest Buffer
+Redis-backed micro-batching of inbound webhook deliveries
+"""
+import json
+import logging
+import time
+import uuid
+
+from django.conf import settings
+
+from apps.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+BUFFER_KEY = 'webhooks:ingest-buffer'
+# Sorted set of in-flight batch lists, scored by when they were taken
+PROCESSING_KEY = 'webhooks:ingest-buffer:processing'
+BATCH_KEY = 'webhooks:ingest-buffer:batch:{id}'
+# Batches still unacknowledged after this many seconds belong to a flush
+# that died; re-inserting them is harmless (ingest ignores known event IDs)
+PROCESSING_TIMEOUT = 300
+
+
+def buffer_event(event: dict) -> None:
+    """
+    Queue a verified delivery for the next batched insert.
+    
+    The first event into an empty buffer schedules a flush after
+    WEBHOOK_BUFFER_FLUSH_INTERVAL; each further WEBHOOK_BUFFER_BATCH_SIZE
+    events flush immediately (once per full batch, not once per push).
+    
+    Args:
+        event: Dict with service, event_id, event_type and payload (and
+            optionally raw; the parsed payload is then not buffered twice)
+    """
+    from .tasks import flush_webhook_buffer
+    
+    if event.get('raw') is not None:
+        event = {key: value for key, value in event.items() if key != 'payload'}
+    length = get_redis().rpush(BUFFER_KEY, json.dumps(event))
+    if length % settings.WEBHOOK_BUFFER_BATCH_SIZE == 0:
+        flush_webhook_buffer.delay()
+    elif length == 1:
+        flush_webhook_buffer.apply_async(countdown=settings.WEBHOOK_BUFFER_FLUSH_INTERVAL)
+
+
+def take_events(count: int) -> tuple[str, list[dict]]:
+    """
+    Move up to `count` buffered events, oldest first, to a batch list.
+    
+    The events stay in Redis until ack_events, so a flush killed before
+    its insert commits loses nothing: requeue_stale puts them back.
+    
+    Returns:
+        tuple: (batch key, events)
+    """
+    batch_key = BATCH_KEY.format(id=uuid.uuid4().hex)
+    pipe = get_redis().pipeline(transaction=True)
+    pipe.zadd(PROCESSING_KEY, {batch_key: time.time()})
+    for _ in range(count):
+        pipe.lmove(BUFFER_KEY, batch_key, 'LEFT', 'RIGHT')
+    items = [item for item in pipe.execute()[1:] if item is not None]
+    
+    if not items:
+        get_redis().zrem(PROCESSING_KEY, batch_key)
+        return batch_key, []
+    
+    events = [json.loads(item) for item in items]
+    for event in events:
+        if 'payload' not in event:
+            event['payload'] = json.loads(event['raw'])
+    return batch_key, events
+
+
+def ack_events(batch_key: str) -> None:
+    """Drop a batch once its events are committed to the database."""
+    pipe = get_redis().pipeline(transaction=True)
+    pipe.delete(batch_key)
+    pipe.zrem(PROCESSING_KEY, batch_key)
+    pipe.execute()
+
+
+def restore_events(batch_key: str) -> int:
+    """
+    Put a batch's events back at the head of the buffer, in order.
+    
+    Returns:
+        int: Number of events restored
+    """
+    redis = get_redis()
+    restored = 0
+    # Moving from the tail to the head keeps the original order
+    while redis.lmove(batch_key, BUFFER_KEY, 'RIGHT', 'LEFT') is not None:
+        restored += 1
+    redis.zrem(PROCESSING_KEY, batch_key)
+    return restored
+
+
+def requeue_stale() -> int:
+    """
+    Restore batches left behind by flushes that died mid-batch.
+    
+    Returns:
+        int: Number of events put back into the buffer
+    """
+    cutoff = time.time() - PROCESSING_TIMEOUT
+    restored = 0
+    for batch_key in get_redis().zrangebyscore(PROCESSING_KEY, 0, cutoff):
+        restored += restore_events(batch_key.decode())
+    if restored:
+        logger.warning(f"Requeued {restored} webhook events from abandoned buffer flushes")
+    return restored
@@ -0,0 +1,110 @@
+"""
+SendGrid Webhook Handler
+Handles SendGrid Event Webhook deliveries (bounces, drops, spam reports)
+"""
+import base64
+import json
+import logging
+from typing import Optional
+
+from django.conf import settings
+
+from apps.events.models import Event
+from apps.webhooks.providers import WebhookProvider
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'X-Twilio-Email-Event-Webhook-Signature'
+TIMESTAMP_HEADER = 'X-Twilio-Email-Event-Webhook-Timestamp'
+
+
+class SendGridProvider(WebhookProvider):
+    """
+    SendGrid Event Webhook (a JSON array of events per request).
+    
+    Deliveries are authenticated with SendGrid's Signed Event Webhook:
+    an ECDSA (P-256, SHA-256) signature over the timestamp header plus the
+    raw body, checked against SENDGRID_WEBHOOK_PUBLIC_KEY.
+    
+    Handles:
+    - bounce
+    - dropped
+    - spamreport
+    """
+    
+    name = 'sendgrid'
+    
+    EVENT_HANDLERS = {
+        'bounce': 'handle_delivery_failure',
+        'dropped': 'handle_delivery_failure',
+        'spamreport': 'handle_delivery_failure',
+    }
+    
+    def __init__(self):
+        super().__init__()
+        self._public_key = None
+    
+    def is_configured(self) -> bool:
+        return bool(settings.SENDGRID_WEBHOOK_PUBLIC_KEY)
+    
+    @property
+    def public_key(self):
+        """Verification key, parsed once per process."""
+        if self._public_key is None:
+            from cryptography.hazmat.primitives.serialization import load_der_public_key
+            self._public_key = load_der_public_key(
+                base64.b64decode(settings.SENDGRID_WEBHOOK_PUBLIC_KEY)
+            )
+        return self._public_key
+    
+    def verify(self, request) -> Optional[list]:
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec
+        
+        signature = request.headers.get(SIGNATURE_HEADER, '')
+        timestamp = request.headers.get(TIMESTAMP_HEADER, '')
+        try:
+            self.public_key.verify(
+                base64.b64decode(signature),
+                timestamp.encode() + request.body,
+                ec.ECDSA(hashes.SHA256()),
+            )
+            events = json.loads(request.body)
+        except (InvalidSignature, ValueError):
+            logger.error("Invalid SendGrid webhook signature or payload")
+            return None
+        
+        if not isinstance(events, list):
+            logger.error("SendGrid webhook payload is not an event array")
+            return None
+        return events
+    
+    def event_id(self, event: dict) -> str:
+        return event.get('sg_event_id')
+    
+    def event_type(self, event: dict) -> str:
+        return event.get('event')
+    
+    def handle_delivery_failure(self, webhook_event) -> bool:
+        """
+        Record an undeliverable email in the audit log.
+        
+        Logs an email.<type> event (e.g. email.bounce) against the user
+        with that address, if there is one.
+        """
+        from apps.users.models import User
+        
+        event = webhook_event.get_payload()
+        email = event.get('email', '')
+        user_id = User.objects.filter(email__iexact=email).values_list('id', flat=True).first()
+        
+        Event.log(
+            event_type=f'email.{webhook_event.event_type}',
+            user_id=user_id,
+            email=email,
+            reason=event.get('reason') or event.get('type'),
+            sg_message_id=event.get('sg_message_id'),
+        )
+        logger.warning(f"SendGrid {webhook_event.event_type} for {email}")
+        return True
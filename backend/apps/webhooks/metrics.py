@@ -0,0 +1,66 @@
+"""
+Webhook Metrics
+Latency, queue wait and retry distributions per event type
+"""
+from apps.core.metrics import COUNT_BUCKETS, Counter, Histogram, record_all
+
+DELIVERY_LATENCY = Histogram(
+    'webhook_delivery_to_processed_seconds',
+    'Time from webhook delivery to the event being applied',
+)
+HANDLER_DURATION = Histogram(
+    'webhook_handler_seconds',
+    'Handler execution time per event (amortized over the batch when drained)',
+)
+QUEUE_WAIT = Histogram(
+    'webhook_queue_wait_seconds',
+    'Time from delivery, or from the retry coming due, until processing starts',
+)
+RETRIES = Histogram(
+    'webhook_retries',
+    'Failed attempts before an event was processed or dead-lettered',
+    unit='1',
+    buckets=COUNT_BUCKETS,
+)
+OUTCOMES = Counter(
+    'webhook_events_total',
+    'Webhook processing attempts by outcome',
+    unit='1',
+)
+
+
+def record_attempts(attempts) -> None:
+    """
+    Record processing attempts in one Redis round trip.
+    
+    Args:
+        attempts: (webhook_event, waiting_since, started, handler_seconds)
+            tuples, taken after the event's outcome was recorded on it;
+            waiting_since is when the event became due (delivery or retry
+            time) and handler_seconds is None if no handler ran
+    """
+    delivery, handler, wait, retries, outcomes = [], [], [], [], []
+    for event, waiting_since, started, handler_seconds in attempts:
+        labels = {'event_type': event.event_type}
+        wait.append((max((started - waiting_since).total_seconds(), 0), labels))
+        if handler_seconds is not None:
+            handler.append((handler_seconds, labels))
+        
+        if event.processed:
+            outcome = 'processed'
+            delivery.append(((event.processed_at - event.created_at).total_seconds(), labels))
+            retries.append((event.retry_count, labels))
+        elif event.dead_lettered_at:
+            outcome = 'dead_lettered'
+            retries.append((event.retry_count, labels))
+        else:
+            outcome = 'failed'
+        outcomes.append((1, {**labels, 'outcome': outcome}))
+    
+    record_all([
+        (DELIVERY_LATENCY, delivery),
+        (HANDLER_DURATION, handler),
+        (QUEUE_WAIT, wait),
+        (RETRIES, retries),
+        (OUTCOMES, outcomes),
+    ])
@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-18 04:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webhooks", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="webhookevent",
+            name="event_created",
+            field=models.DateTimeField(
+                blank=True, help_text="When the service created the event", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="object_id",
+            field=models.CharField(
+                blank=True,
+                help_text="ID of the object the event refers to (e.g., in_..., sub_...)",
+                max_length=255,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="webhookevent",
+            index=models.Index(
+                fields=["service", "object_id", "event_created"],
+                name="webhook_events_object_idx",
+            ),
+        ),
+        # Backfill ordering columns for recorded events
+        migrations.RunSQL(
+            sql="""
+                UPDATE webhook_events
+                SET object_id = COALESCE(payload->'data'->'object'->>'id', ''),
+                    event_created = to_timestamp((payload->>'created')::bigint)
+                WHERE payload ? 'created'
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
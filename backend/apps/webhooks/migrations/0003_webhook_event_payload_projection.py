@@ -0,0 +1,96 @@
+# Generated by Django 6.0 on 2026-10-18 04:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webhooks", "0002_webhook_event_object_ordering"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="webhookevent",
+            name="failure_message",
+            field=models.CharField(
+                blank=True,
+                help_text="Payment failure message reported by the service",
+                max_length=500,
+            ),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="object_status",
+            field=models.CharField(
+                blank=True,
+                help_text="Status of the object the event refers to",
+                max_length=50,
+            ),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="payment_intent_id",
+            field=models.CharField(
+                blank=True,
+                help_text="Payment intent ID (invoice events)",
+                max_length=255,
+            ),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="period_end",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="End of the billing period the object covers",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="period_start",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Start of the billing period the object covers",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="raw_body",
+            field=models.BinaryField(
+                blank=True,
+                help_text="Gzip-compressed raw payload (compact storage mode)",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="webhookevent",
+            name="payload",
+            field=models.JSONField(
+                blank=True, help_text="Raw webhook payload from the service", null=True
+            ),
+        ),
+        # Backfill the projection for recorded events (payloads stay JSONB)
+        migrations.RunSQL(
+            sql="""
+                UPDATE webhook_events
+                SET object_status = LEFT(COALESCE(payload->'data'->'object'->>'status', ''), 50),
+                    payment_intent_id = COALESCE(
+                        CASE jsonb_typeof(payload->'data'->'object'->'payment_intent')
+                            WHEN 'object' THEN payload->'data'->'object'->'payment_intent'->>'id'
+                            ELSE payload->'data'->'object'->>'payment_intent'
+                        END, ''),
+                    period_start = to_timestamp((COALESCE(
+                        payload->'data'->'object'->>'period_start',
+                        payload->'data'->'object'->>'current_period_start'))::bigint),
+                    period_end = to_timestamp((COALESCE(
+                        payload->'data'->'object'->>'period_end',
+                        payload->'data'->'object'->>'current_period_end'))::bigint),
+                    failure_message = LEFT(COALESCE(
+                        payload->'data'->'object'->'last_payment_error'->>'message', ''), 500)
+                WHERE jsonb_typeof(payload->'data'->'object') = 'object'
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
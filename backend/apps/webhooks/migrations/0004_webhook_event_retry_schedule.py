@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-18 04:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webhooks", "0003_webhook_event_payload_projection"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="webhookevent",
+            name="dead_lettered_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the event exhausted its retries; replay from the admin",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="next_attempt_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When a failed event is due for another attempt (empty = now)",
+                null=True,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="webhookevent",
+            index=models.Index(
+                fields=["processed", "next_attempt_at"], name="webhook_events_retry_idx"
+            ),
+        ),
+        # Events that already used up the old retry budget are dead letters
+        migrations.RunSQL(
+            sql="""
+                UPDATE webhook_events
+                SET dead_lettered_at = COALESCE(last_retry_at, NOW())
+                WHERE NOT processed AND retry_count >= 5
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 04:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webhooks", "0004_webhook_event_retry_schedule"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="webhookevent",
+            name="due_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When a retry leased by the sweeper became due (queue wait metric)",
+                null=True,
+            ),
+        ),
+    ]
@@ -2,8 +2,17 @@
 WebhookEvent Model
 Track external webhook events from Stripe, SendGrid, etc. (PRD-d-3)
 """
+import gzip
+import io
+import json
+import random
 import uuid
-from django.db import models
+from datetime import timedelta
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 
 
@@ -52,10 +61,59 @@ class WebhookEvent(models.Model):
         help_text='Event type (e.g., invoice.paid, customer.subscription.created)'
     )
     
-    # Raw payload
+    # Object the event is about (data.object.id) and when the service
+    # created the event; together they define per-object processing order
+    object_id = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text='ID of the object the event refers to (e.g., in_..., sub_...)'
+    )
+    event_created = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='When the service created the event'
+    )
+    
+    # Raw payload: JSONB, or gzip-compressed bytes in compact storage mode
+    # (WEBHOOK_COMPACT_PAYLOADS); read it with get_payload()
     payload = models.JSONField(
+        null=True,
+        blank=True,
         help_text='Raw webhook payload from the service'
     )
+    raw_body = models.BinaryField(
+        null=True,
+        blank=True,
+        help_text='Gzip-compressed raw payload (compact storage mode)'
+    )
+    
+    # Projection of the fields handlers need, extracted at ingest so
+    # processing never decodes the full payload
+    object_status = models.CharField(
+        max_length=50,
+        blank=True,
+        help_text='Status of the object the event refers to'
+    )
+    payment_intent_id = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text='Payment intent ID (invoice events)'
+    )
+    period_start = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='Start of the billing period the object covers'
+    )
+    period_end = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='End of the billing period the object covers'
+    )
+    failure_message = models.CharField(
+        max_length=500,
+        blank=True,
+        help_text='Payment failure message reported by the service'
+    )
     
     # Processing status
     processed = models.BooleanField(
@@ -78,6 +136,21 @@ class WebhookEvent(models.Model):
         blank=True,
         help_text='Timestamp of last retry attempt'
     )
+    next_attempt_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='When a failed event is due for another attempt (empty = now)'
+    )
+    due_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='When a retry leased by the sweeper became due (queue wait metric)'
+    )
+    dead_lettered_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='When the event exhausted its retries; replay from the admin'
+    )
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -94,14 +167,39 @@ class WebhookEvent(models.Model):
         indexes = [
             models.Index(fields=['service', 'event_type']),
             models.Index(fields=['processed', 'created_at']),
+            models.Index(
+                fields=['processed', 'next_attempt_at'],
+                name='webhook_events_retry_idx'
+            ),
             models.Index(fields=['created_at']),
+            models.Index(
+                fields=['service', 'object_id', 'event_created'],
+                name='webhook_events_object_idx'
+            ),
         ]
         ordering = ['-created_at']
     
+    # Columns holding the full payload; deferred wherever only the
+    # projection is needed
+    PAYLOAD_FIELDS = ('payload', 'raw_body')
+    
+    # Fields written by record_failure()
+    FAILURE_FIELDS = [
+        'processing_error', 'retry_count', 'last_retry_at', 'next_attempt_at', 'due_at', 'dead_lettered_at',
+    ]
+    
     def __str__(self):
         status = '✓' if self.processed else '✗'
         return f"Webhook [{status}]: {self.service}/{self.event_type}"
     
+    def get_payload(self) -> dict:
+        """The full payload, decompressed in compact storage mode."""
+        if self.payload is not None:
+            return self.payload
+        if self.raw_body is not None:
+            return json.loads(gzip.decompress(bytes(self.raw_body)))
+        return {}
+    
     def mark_processed(self):
         """Mark the event as successfully processed."""
         self.processed = True
@@ -109,21 +207,402 @@ class WebhookEvent(models.Model):
         self.save(update_fields=['processed', 'processed_at'])
     
     def mark_failed(self, error: str):
-        """Mark the event as failed with error message."""
+        """Mark the event as failed with error message and schedule a retry."""
+        self.record_failure(error)
+        self.save(update_fields=self.FAILURE_FIELDS)
+    
+    def record_failure(self, error: str, now=None) -> None:
+        """
+        Record a failed attempt without saving (see FAILURE_FIELDS).
+        
+        Schedules the next attempt with jittered exponential backoff, or
+        dead-letters the event after WEBHOOK_MAX_ATTEMPTS attempts.
+        """
+        now = now or timezone.now()
         self.processing_error = error
         self.retry_count += 1
-        self.last_retry_at = timezone.now()
-        self.save(update_fields=['processing_error', 'retry_count', 'last_retry_at'])
+        self.last_retry_at = now
+        self.due_at = None
+        if self.retry_count >= settings.WEBHOOK_MAX_ATTEMPTS:
+            self.next_attempt_at = None
+            self.dead_lettered_at = now
+        else:
+            self.next_attempt_at = now + self.retry_delay(self.retry_count)
+    
+    @property
+    def due_since(self):
+        """When this event became due for its current attempt (delivery or retry time)."""
+        return self.due_at or self.next_attempt_at or self.created_at
+    
+    @staticmethod
+    def retry_delay(attempt: int) -> timedelta:
+        """
+        Backoff before retry number `attempt` (1-based).
+        
+        Doubles from WEBHOOK_RETRY_BASE_DELAY up to WEBHOOK_RETRY_MAX_DELAY,
+        with "equal jitter" (half fixed, half random) so events that failed
+        together during an outage don't all come due at the same moment.
+        """
+        ceiling = min(
+            settings.WEBHOOK_RETRY_MAX_DELAY,
+            settings.WEBHOOK_RETRY_BASE_DELAY * 2 ** (attempt - 1),
+        )
+        return timedelta(seconds=ceiling / 2 + random.uniform(0, ceiling / 2))
     
     @property
     def can_retry(self) -> bool:
-        """Check if the event can be retried (max 5 retries)."""
-        return not self.processed and self.retry_count < 5
+        """Check if the event can be retried (not processed or dead-lettered)."""
+        return not self.processed and self.dead_lettered_at is None
+    
+    @property
+    def is_dead_lettered(self) -> bool:
+        return not self.processed and self.dead_lettered_at is not None
     
     @classmethod
     def get_pending(cls, service: str = None, limit: int = 100):
-        """Get pending (unprocessed) webhook events."""
-        qs = cls.objects.filter(processed=False, retry_count__lt=5)
+        """Get pending (unprocessed) webhook events that are due."""
+        qs = cls.objects.filter(
+            models.Q(next_attempt_at__isnull=True) | models.Q(next_attempt_at__lte=timezone.now()),
+            processed=False,
+            dead_lettered_at__isnull=True,
+        ).defer(*cls.PAYLOAD_FIELDS)
         if service:
             qs = qs.filter(service=service)
         return qs.order_by('created_at')[:limit]
+    
+    @classmethod
+    def schedule_due(cls, service: str = None, limit: int = 500, lease: int = 300) -> list:
+        """
+        Claim failed events whose retry is due, for re-enqueueing.
+        
+        One UPDATE ... RETURNING picks the due rows (oldest first, skipping
+        rows locked elsewhere) and pushes their next_attempt_at forward by
+        `lease` seconds, so the next sweep doesn't enqueue them again while
+        their task is waiting in the queue. The task's own success or
+        failure then overwrites the lease. The time each event actually
+        became due is kept in due_at, so queue wait is measured from there
+        rather than from the lease expiry.
+        
+        Returns:
+            list: IDs of the claimed events
+        """
+        table = cls._meta.db_table
+        service_filter = 'AND service = %s' if service else ''
+        params = [timezone.now() + timedelta(seconds=lease), timezone.now()]
+        if service:
+            params.append(service)
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table}
+                SET due_at = next_attempt_at, next_attempt_at = %s
+                WHERE id IN (
+                    SELECT id FROM {table}
+                    WHERE NOT processed
+                      AND dead_lettered_at IS NULL
+                      AND next_attempt_at <= %s
+                      {service_filter}
+                    ORDER BY next_attempt_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id
+                """,
+                params,
+            )
+            return [row[0] for row in cursor.fetchall()]
+    
+    @classmethod
+    def purge_processed(
+        cls,
+        before,
+        batch_size: int = 1000,
+        max_batches: int = None,
+        archive_storage: str = None,
+    ) -> int:
+        """
+        Delete processed events created before a cut-off, in bounded batches.
+        
+        Each batch is one short transaction whose DELETE picks rows through
+        the (processed, created_at) index (ORDER BY created_at LIMIT n), so
+        locks and WAL stay small however far behind retention is. Rows
+        locked elsewhere are skipped, not waited on.
+        
+        With archive_storage set, each batch's deleted rows are written to
+        that STORAGES alias as one gzip-compressed NDJSON file before the
+        batch commits; a failed upload rolls the batch back.
+        
+        Args:
+            before: Delete events created before this time
+            batch_size: Rows deleted per statement
+            max_batches: Stop after this many batches (None = until done)
+            archive_storage: Optional STORAGES alias to archive to
+        
+        Returns:
+            int: Number of events deleted
+        """
+        from django.db import transaction
+        
+        table = cls._meta.db_table
+        returning = (
+            'RETURNING id, service, event_id, event_type, object_id, event_created, '
+            'processed_at, created_at, payload::text, raw_body'
+        ) if archive_storage else ''
+        deleted = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    DELETE FROM {table}
+                    WHERE id IN (
+                        SELECT id FROM {table}
+                        WHERE processed AND created_at < %s
+                        ORDER BY created_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    {returning}
+                    """,
+                    [before, batch_size],
+                )
+                count = cursor.rowcount
+                if archive_storage and count:
+                    cls._archive(cursor.fetchall(), archive_storage)
+            deleted += count
+            batches += 1
+            if count < batch_size:
+                break
+        return deleted
+    
+    @staticmethod
+    def _archive(rows, storage: str) -> str:
+        """Upload deleted rows as one gzip-compressed NDJSON file."""
+        from apps.core.storage import upload_file
+        
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6, mtime=0) as archive:
+            for row in rows:
+                *fields, payload, raw_body = row
+                record = dict(zip(
+                    ('id', 'service', 'event_id', 'event_type', 'object_id',
+                     'event_created', 'processed_at', 'created_at'),
+                    fields,
+                ))
+                if payload is None and raw_body is not None:
+                    payload = gzip.decompress(bytes(raw_body)).decode()
+                # Splice the stored JSON in as-is rather than re-encoding it
+                line = json.dumps(record, cls=DjangoJSONEncoder)[:-1] + f',"payload":{payload or "null"}}}\n'
+                archive.write(line.encode())
+        
+        first_created = min(row[7] for row in rows)
+        name = (
+            f"webhooks/archive/{first_created:%Y/%m/%d}/"
+            f"{timezone.now():%Y%m%dT%H%M%S}-{rows[0][0]}.ndjson.gz"
+        )
+        return upload_file(name, buffer.getvalue(), storage=storage, content_type='application/gzip')
+    
+    @classmethod
+    def claim_pending(cls, service: str = None, limit: int = 100) -> list:
+        """
+        Claim a batch of pending events for this transaction.
+        
+        Rows are locked with SELECT ... FOR UPDATE SKIP LOCKED, so
+        concurrent drain workers each get a disjoint batch instead of
+        waiting on one another. Must be called inside transaction.atomic().
+        
+        Events whose object has an earlier pending event still waiting out
+        its retry backoff are left out: their lane is not ready, and
+        claiming them on every run would only crowd out newer events.
+        """
+        waiting = cls.objects.filter(
+            service=OuterRef('service'),
+            object_id=OuterRef('object_id'),
+            event_created__lt=OuterRef('event_created'),
+            processed=False,
+            dead_lettered_at__isnull=True,
+            next_attempt_at__gt=timezone.now(),
+        )
+        pending = cls.get_pending(service=service, limit=None).exclude(Exists(waiting))
+        return list(pending[:limit].select_for_update(skip_locked=True))
+    
+    @staticmethod
+    def try_lock_objects(service: str, object_ids) -> set:
+        """
+        Take the per-object advisory locks (see lock_object) without waiting.
+        
+        Returns:
+            set: Object IDs whose lock was acquired; the rest are busy in
+            another transaction
+        """
+        object_ids = sorted(set(object_ids))
+        if not object_ids:
+            return set()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT object_id
+                FROM unnest(%s::text[]) AS object_id
+                WHERE pg_try_advisory_xact_lock(hashtextextended(%s || ':' || object_id, 0))
+                """,
+                [object_ids, service],
+            )
+            return {row[0] for row in cursor.fetchall()}
+    
+    def lock_object(self) -> None:
+        """
+        Serialize processing of events for the same object.
+        
+        Takes a transaction-level advisory lock keyed on service and object
+        ID, so events for one object run one at a time while events for
+        different objects run fully in parallel. Must be called inside
+        transaction.atomic(); the lock is released at commit.
+        """
+        if not self.object_id:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))',
+                [f'{self.service}:{self.object_id}'],
+            )
+    
+    def pending_predecessors(self):
+        """Unprocessed events for the same object created before this one."""
+        if not self.object_id or self.event_created is None:
+            return WebhookEvent.objects.none()
+        return WebhookEvent.objects.filter(
+            service=self.service,
+            object_id=self.object_id,
+            processed=False,
+            dead_lettered_at__isnull=True,
+        ).filter(
+            models.Q(event_created__lt=self.event_created) |
+            models.Q(event_created=self.event_created, created_at__lt=self.created_at)
+        ).defer(*self.PAYLOAD_FIELDS).order_by('event_created', 'created_at')
+    
+    def is_superseded(self) -> bool:
+        """Whether a newer event for the same object was already processed."""
+        if not self.object_id or self.event_created is None:
+            return False
+        return WebhookEvent.objects.filter(
+            service=self.service,
+            object_id=self.object_id,
+            processed=True,
+            event_created__gt=self.event_created,
+        ).exists()
+    
+    @staticmethod
+    def parse_object_id(payload: dict) -> str:
+        """Extract data.object.id from a webhook payload."""
+        obj = (payload.get('data') or {}).get('object') or {}
+        return str(obj.get('id') or '') if isinstance(obj, dict) else ''
+    
+    @staticmethod
+    def parse_event_created(payload: dict):
+        """Convert the payload's Unix 'created' timestamp to a datetime."""
+        return _from_timestamp(payload.get('created'))
+    
+    @classmethod
+    def parse_projection(cls, payload: dict) -> dict:
+        """
+        Extract the typed projection columns from a webhook payload.
+        
+        Handles both invoice (period_start/period_end) and subscription
+        (current_period_start/current_period_end) objects.
+        """
+        obj = (payload.get('data') or {}).get('object') or {}
+        if not isinstance(obj, dict):
+            obj = {}
+        
+        payment_intent = obj.get('payment_intent') or ''
+        if isinstance(payment_intent, dict):  # Expanded
+            payment_intent = payment_intent.get('id') or ''
+        error = obj.get('last_payment_error') or {}
+        
+        return {
+            'object_id': cls.parse_object_id(payload),
+            'event_created': cls.parse_event_created(payload),
+            'object_status': str(obj.get('status') or '')[:50],
+            'payment_intent_id': str(payment_intent),
+            'period_start': _from_timestamp(obj.get('period_start') or obj.get('current_period_start')),
+            'period_end': _from_timestamp(obj.get('period_end') or obj.get('current_period_end')),
+            'failure_message': str(error.get('message') or '')[:500] if isinstance(error, dict) else '',
+        }
+    
+    @classmethod
+    def ingest(cls, events: list[dict]) -> list[tuple]:
+        """
+        Record webhook deliveries, skipping duplicates, in one statement.
+        
+        INSERT ... ON CONFLICT (event_id) DO NOTHING RETURNING makes the
+        duplicate check and the insert a single atomic round trip, so
+        concurrent retries of the same event can never both be recorded.
+        
+        The projection columns are filled from the payload here. With
+        WEBHOOK_COMPACT_PAYLOADS on, the payload is stored gzip-compressed
+        in raw_body instead of as JSONB.
+        
+        Args:
+            events: Dicts with service, event_id, event_type and payload,
+                plus optionally raw (the payload's JSON text as delivered)
+        
+        Returns:
+            list: (id, event_id) of the newly recorded events
+        """
+        rows = {event['event_id']: event for event in events}
+        if not rows:
+            return []
+        
+        compact = settings.WEBHOOK_COMPACT_PAYLOADS
+        table = cls._meta.db_table
+        values = []
+        params = []
+        for event in rows.values():
+            values.append(
+                "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb, %s, FALSE, '', 0, NOW())"
+            )
+            projection = cls.parse_projection(event['payload'])
+            if event.get('raw') is not None:
+                body = event['raw'].encode()  # As delivered; no re-encoding
+            else:
+                body = json.dumps(event['payload'], separators=(',', ':')).encode()
+            params.extend([
+                uuid.uuid4(),
+                event['service'],
+                event['event_id'],
+                event['event_type'],
+                projection['object_id'],
+                projection['event_created'],
+                projection['object_status'],
+                projection['payment_intent_id'],
+                projection['period_start'],
+                projection['period_end'],
+                projection['failure_message'],
+                None if compact else body.decode(),
+                gzip.compress(body, compresslevel=6, mtime=0) if compact else None,
+            ])
+        
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (
+                    id, service, event_id, event_type, object_id, event_created,
+                    object_status, payment_intent_id, period_start, period_end,
+                    failure_message, payload, raw_body,
+                    processed, processing_error, retry_count, created_at
+                )
+                VALUES {', '.join(values)}
+                ON CONFLICT (event_id) DO NOTHING
+                RETURNING id, event_id
+                """,
+                params,
+            )
+            return cursor.fetchall()
+
+
+def _from_timestamp(value):
+    """Convert a Unix timestamp to an aware datetime (None if missing)."""
+    if value is None:
+        return None
+    return datetime.fromtimestamp(int(value), tz=dt_timezone.utc)
@@ -0,0 +1,108 @@
+"""
+Webhook Providers
+Registry of inbound webhook sources and their dispatch tables
+"""
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_providers = {}
+
+
+class WebhookProvider:
+    """
+    One inbound webhook source (Stripe, SendGrid, ...).
+    
+    A provider verifies deliveries, extracts event IDs and types, and maps
+    event types to handlers. Subclasses list handler method names in
+    EVENT_HANDLERS; they are resolved to bound methods once, when the
+    provider is registered at startup, so dispatch is a single dict
+    lookup per event.
+    
+    Handlers take a WebhookEvent and return True if it was handled (event
+    types without a handler count as handled).
+    """
+    
+    # Value stored in WebhookEvent.service and used in /webhooks/<name>/
+    name = ''
+    
+    # Event type to handler method name
+    EVENT_HANDLERS = {}
+    
+    def __init__(self):
+        self.dispatch_table: dict[str, Callable] = {
+            event_type: getattr(self, handler_name)
+            for event_type, handler_name in self.EVENT_HANDLERS.items()
+        }
+    
+    def is_configured(self) -> bool:
+        """Whether the secrets needed to verify deliveries are set."""
+        return True
+    
+    def verify(self, request) -> Optional[list]:
+        """
+        Verify a delivery and parse its events.
+        
+        Returns:
+            list: Event dicts, or None if the delivery is not authentic
+        """
+        raise NotImplementedError
+    
+    def event_id(self, event: dict) -> str:
+        raise NotImplementedError
+    
+    def event_type(self, event: dict) -> str:
+        raise NotImplementedError
+    
+    def records(self, events: list, body: bytes = None) -> list[dict]:
+        """
+        WebhookEvent.ingest records for verified events (skips events
+        without an ID).
+        
+        Providers that receive one event per delivery can add the raw
+        body as 'raw' so it is stored as delivered rather than re-encoded.
+        """
+        return [
+            {
+                'service': self.name,
+                'event_id': self.event_id(event),
+                'event_type': self.event_type(event) or '',
+                'payload': event,
+            }
+            for event in events
+            if self.event_id(event)
+        ]
+    
+    def dispatch(self, webhook_event) -> bool:
+        """Run the handler for an event's type."""
+        handler = self.dispatch_table.get(webhook_event.event_type)
+        if handler is None:
+            logger.info(f"Unhandled {self.name} event type: {webhook_event.event_type}")
+            return True
+        return handler(webhook_event)
+    
+    def enqueue(self, webhook_event_ids) -> None:
+        """Queue newly recorded (or due for retry) events for processing."""
+        from .tasks import process_webhook_event
+        
+        for webhook_event_id in webhook_event_ids:
+            process_webhook_event.delay(str(webhook_event_id))
+    
+    def enqueue_buffered(self, webhook_event_ids) -> None:
+        """Queue a micro-batch flushed from the ingest buffer."""
+        self.enqueue(webhook_event_ids)
+
+
+def register(provider: WebhookProvider) -> WebhookProvider:
+    """Register a provider (call from AppConfig.ready)."""
+    _providers[provider.name] = provider
+    return provider
+
+
+def get_provider(name: str) -> Optional[WebhookProvider]:
+    return _providers.get(name)
+
+
+def get_providers() -> list[WebhookProvider]:
+    return list(_providers.values())
@@ -9,22 +9,35 @@ from django.utils import timezone
 logger = logging.getLogger(__name__)
 
 
-@shared_task(queue='high', bind=True, max_retries=3)
-def process_stripe_webhook(self, webhook_event_id: str) -> dict:
+@shared_task(queue='high')
+def process_stripe_webhook(webhook_event_id: str) -> dict:
     """
-    Process a Stripe webhook event.
+    Process a Stripe webhook event in order for its object.
+    
+    Events for the same Stripe object (data.object.id) form a lane: the
+    task takes the object's advisory lock, then processes any earlier
+    pending events for that object (by Stripe's 'created' timestamp)
+    before this one. State snapshots superseded by an already processed
+    newer event are skipped. Events for different objects run in parallel.
+    
+    Failures are not retried with Celery countdowns (lost on worker
+    restart); the event's next_attempt_at is set with jittered backoff and
+    retry_failed_webhook_events re-enqueues it when due. Predecessors
+    waiting out their backoff are not run early: the lane stops at the
+    first one that is not yet due, or that fails, and this event is
+    rescheduled for no earlier than that predecessor's next attempt.
     
     Args:
         webhook_event_id: UUID of the WebhookEvent
-        
+    
     Returns:
         dict: Processing result
     """
+    from django.db import transaction
     from .models import WebhookEvent
-    from .handlers.stripe import StripeWebhookHandler
     
     try:
-        webhook_event = WebhookEvent.objects.get(id=webhook_event_id)
+        webhook_event = WebhookEvent.objects.defer(*WebhookEvent.PAYLOAD_FIELDS).get(id=webhook_event_id)
     except WebhookEvent.DoesNotExist:
         logger.error(f"WebhookEvent not found: {webhook_event_id}")
         return {'error': 'WebhookEvent not found'}
@@ -33,33 +46,386 @@ def process_stripe_webhook(self, webhook_event_id: str) -> dict:
         logger.info(f"WebhookEvent already processed: {webhook_event_id}")
         return {'status': 'already_processed'}
     
-    # Mark processing time
-    webhook_event.last_retry_at = timezone.now()
-    webhook_event.save(update_fields=['last_retry_at'])
+    with transaction.atomic():
+        webhook_event.lock_object()
+        
+        # Another lane drain may have handled it while we waited
+        webhook_event.refresh_from_db(fields=['processed', 'retry_count', 'dead_lettered_at'])
+        if webhook_event.processed:
+            return {'status': 'already_processed'}
+        if webhook_event.is_dead_lettered:
+            return {'status': 'dead_lettered'}
+        
+        now = timezone.now()
+        for predecessor in webhook_event.pending_predecessors():
+            if predecessor.next_attempt_at and predecessor.next_attempt_at > now:
+                _defer(webhook_event, predecessor.next_attempt_at)
+                return {'status': 'deferred', 'until': predecessor.next_attempt_at.isoformat()}
+            error = _process_in_order(predecessor)
+            if error:
+                _defer(webhook_event, predecessor.next_attempt_at or timezone.now())
+                return {'status': 'deferred', 'error': error}
+        
+        error = _process_in_order(webhook_event)
+    
+    if not error:
+        logger.info(f"WebhookEvent processed: {webhook_event_id}")
+        return {'status': 'processed'}
+    
+    return {'error': error}
+
+
+def _defer(webhook_event, until) -> None:
+    """Schedule an event behind a predecessor that is not done yet."""
+    if webhook_event.next_attempt_at is None or webhook_event.next_attempt_at < until:
+        webhook_event.next_attempt_at = until
+        webhook_event.due_at = None
+        webhook_event.save(update_fields=['next_attempt_at', 'due_at'])
+
+
+def _process_in_order(webhook_event) -> str:
+    """
+    Apply one event inside the lane's transaction.
+    
+    Returns:
+        str: Error message, or '' on success
+    """
+    import time
+    from django.db import transaction
+    from .handlers.stripe import StripeWebhookHandler
+    from .metrics import record_attempts
+    
+    waiting_since = webhook_event.due_since
+    started = timezone.now()
+    
+    if (
+        webhook_event.event_type in StripeWebhookHandler.SUPERSEDABLE_EVENT_TYPES
+        and webhook_event.is_superseded()
+    ):
+        logger.info(f"WebhookEvent superseded by a newer event: {webhook_event.id}")
+        webhook_event.mark_processed()
+        record_attempts([(webhook_event, waiting_since, started, None)])
+        return ''
     
+    handler_started = time.perf_counter()
     try:
-        # Handle the event
-        success = StripeWebhookHandler.handle_event(webhook_event)
-        
-        if success:
-            webhook_event.mark_processed()
-            logger.info(f"WebhookEvent processed: {webhook_event_id}")
-            return {'status': 'processed'}
-        else:
-            raise Exception("Handler returned False")
-            
+        # Savepoint: a failed handler must not poison the lane's transaction
+        with transaction.atomic():
+            success = StripeWebhookHandler.handle_event(webhook_event)
     except Exception as e:
-        error_msg = str(e)
-        logger.exception(f"Error processing webhook {webhook_event_id}: {error_msg}")
-        
+        logger.exception(f"Error processing webhook {webhook_event.id}: {e}")
+        success = False
+    handler_seconds = time.perf_counter() - handler_started
+    
+    if success:
+        webhook_event.mark_processed()
+        error_msg = ''
+    else:
+        error_msg = f"Handler failed for {webhook_event.event_type}"
         webhook_event.mark_failed(error_msg)
+    
+    record_attempts([(webhook_event, waiting_since, started, handler_seconds)])
+    return error_msg
+
+
+@shared_task(queue='high')
+def drain_webhook_events(service: str = 'stripe', batch_size: int = 100, max_batches: int = 50) -> dict:
+    """
+    Process pending webhook events in batches until none are left.
+    
+    Each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so any
+    number of drain workers can run side by side. Per-object ordering
+    matches process_stripe_webhook: events behind an earlier event still
+    in retry backoff are not claimed, objects whose lane is busy in
+    another transaction, or that have earlier pending events outside the
+    batch, are left for a later run, and superseded state snapshots are
+    skipped. The remaining events are applied by
+    StripeWebhookHandler.handle_batch (one query per model to load,
+    bulk_update to write), and the events' own status is written with a
+    single bulk_update.
+    
+    Batches are drained until one comes back short (or nothing in a full
+    batch could be applied); after max_batches full batches the task
+    re-enqueues itself rather than holding a worker indefinitely.
+    
+    Args:
+        service: Service whose events to drain
+        batch_size: Events claimed per batch
+        max_batches: Batches per run before re-enqueueing
+    
+    Returns:
+        dict: Counts of processed, failed and deferred events
+    """
+    totals = {'processed': 0, 'failed': 0, 'deferred': 0}
+    for _ in range(max_batches):
+        claimed, counts = _drain_batch(service, batch_size)
+        for key, value in counts.items():
+            totals[key] += value
+        if claimed < batch_size or counts['deferred'] == claimed:
+            break
+    else:
+        drain_webhook_events.delay(service, batch_size, max_batches)
+    
+    if any(totals.values()):
+        logger.info(
+            f"Drained {service} webhooks: {totals['processed']} processed, "
+            f"{totals['failed']} failed, {totals['deferred']} deferred"
+        )
+    return totals
+
+
+def _drain_batch(service: str, batch_size: int) -> tuple[int, dict]:
+    """
+    Claim and process one batch (see drain_webhook_events).
+    
+    Returns:
+        tuple: (events claimed, counts of processed, failed and deferred)
+    """
+    import time
+    from django.db import transaction
+    from django.db.models import Max, Min
+    from .handlers.stripe import StripeWebhookHandler
+    from .metrics import record_attempts
+    from .models import WebhookEvent
+    
+    with transaction.atomic():
+        events = WebhookEvent.claim_pending(service=service, limit=batch_size)
+        if not events:
+            return 0, {'processed': 0, 'failed': 0, 'deferred': 0}
+        started = timezone.now()
+        waiting_since = {event.id: event.due_since for event in events}
         
-        # Retry with exponential backoff
-        if self.request.retries < self.max_retries:
-            countdown = 60 * (2 ** self.request.retries)  # 60s, 120s, 240s
-            raise self.retry(exc=e, countdown=countdown)
+        # Lane order: skip busy objects and those with earlier events elsewhere
+        object_ids = {event.object_id for event in events if event.object_id}
+        locked = WebhookEvent.try_lock_objects(service, object_ids)
+        blocked = dict(
+            WebhookEvent.objects.filter(
+                service=service,
+                object_id__in=locked,
+                processed=False,
+                dead_lettered_at__isnull=True,
+            ).exclude(
+                id__in=[event.id for event in events]
+            ).values('object_id').annotate(first=Min('event_created')).values_list('object_id', 'first')
+        )
+        
+        ready = []
+        for event in events:
+            if event.object_id and event.object_id not in locked:
+                continue  # Lane busy in another transaction
+            first = blocked.get(event.object_id, False)
+            if first is not False and not (
+                first and event.event_created and event.event_created < first
+            ):
+                continue  # Earlier pending event for the object outside this batch
+            ready.append(event)
+        deferred = len(events) - len(ready)
+        ready.sort(key=lambda event: (event.event_created or event.created_at, event.created_at))
+        
+        # Superseded snapshots: a newer event is in this batch or already processed
+        latest = dict(
+            WebhookEvent.objects.filter(
+                service=service,
+                object_id__in={event.object_id for event in ready if event.object_id},
+                processed=True,
+            ).values('object_id').annotate(latest=Max('event_created')).values_list('object_id', 'latest')
+        )
+        for event in ready:
+            if event.object_id and event.event_created:
+                previous = latest.get(event.object_id)
+                if previous is None or event.event_created > previous:
+                    latest[event.object_id] = event.event_created
         
-        return {'error': error_msg}
+        to_apply = []
+        now = timezone.now()
+        for event in ready:
+            newest = latest.get(event.object_id)
+            if (
+                event.event_type in StripeWebhookHandler.SUPERSEDABLE_EVENT_TYPES
+                and event.event_created and newest and newest > event.event_created
+            ):
+                event.processed = True
+                event.processed_at = now
+            else:
+                to_apply.append(event)
+        
+        handler_started = time.perf_counter()
+        results = StripeWebhookHandler.handle_batch(to_apply)
+        handler_seconds = (time.perf_counter() - handler_started) / max(len(to_apply), 1)
+        
+        failed = 0
+        for event in to_apply:
+            error = results.get(event.id, '')
+            if error is None:
+                deferred += 1
+            elif error:
+                event.record_failure(error, now)
+                failed += 1
+            else:
+                event.processed = True
+                event.processed_at = now
+        processed = sum(1 for event in ready if event.processed)
+        
+        WebhookEvent.objects.bulk_update(
+            ready,
+            ['processed', 'processed_at', *WebhookEvent.FAILURE_FIELDS],
+        )
+    
+    applied = {event.id for event in to_apply}
+    record_attempts([
+        (event, waiting_since[event.id], started, handler_seconds if event.id in applied else None)
+        for event in ready
+        if results.get(event.id, '') is not None
+    ])
+    
+    return len(events), {'processed': processed, 'failed': failed, 'deferred': deferred}
+
+
+@shared_task(queue='high')
+def process_webhook_event(webhook_event_id: str) -> dict:
+    """
+    Process a webhook event with its registered provider's handler.
+    
+    Used for providers without per-object ordering (e.g. SendGrid); Stripe
+    events go through process_stripe_webhook.
+    
+    Args:
+        webhook_event_id: UUID of the WebhookEvent
+    
+    Returns:
+        dict: Processing result
+    """
+    import time
+    from django.db import transaction
+    from .metrics import record_attempts
+    from .models import WebhookEvent
+    from .providers import get_provider
+    
+    try:
+        webhook_event = WebhookEvent.objects.get(id=webhook_event_id)
+    except WebhookEvent.DoesNotExist:
+        logger.error(f"WebhookEvent not found: {webhook_event_id}")
+        return {'error': 'WebhookEvent not found'}
+    
+    if webhook_event.processed:
+        return {'status': 'already_processed'}
+    if webhook_event.is_dead_lettered:
+        return {'status': 'dead_lettered'}
+    
+    provider = get_provider(webhook_event.service)
+    if provider is None:
+        return {'error': f'No webhook provider registered for {webhook_event.service}'}
+    
+    waiting_since = webhook_event.due_since
+    started = timezone.now()
+    handler_started = time.perf_counter()
+    try:
+        with transaction.atomic():
+            success = provider.dispatch(webhook_event)
+    except Exception as e:
+        logger.exception(f"Error processing webhook {webhook_event.id}: {e}")
+        success = False
+    handler_seconds = time.perf_counter() - handler_started
+    
+    if success:
+        webhook_event.mark_processed()
+        error = ''
+    else:
+        error = f"Handler failed for {webhook_event.event_type}"
+        webhook_event.mark_failed(error)
+    
+    record_attempts([(webhook_event, waiting_since, started, handler_seconds)])
+    if error:
+        return {'error': error}
+    return {'status': 'processed'}
+
+
+@shared_task(queue='high')
+def retry_failed_webhook_events(batch_size: int = 500) -> dict:
+    """
+    Re-enqueue failed webhook events whose retry is due.
+    Run via Celery beat (every minute).
+    
+    Due events are claimed in one statement (see
+    WebhookEvent.schedule_due), so overlapping sweeps never enqueue an
+    event twice. Retry times are jittered when each failure is recorded,
+    so after an outage events come due spread out rather than all at once,
+    and each sweep enqueues at most batch_size of them.
+    
+    Args:
+        batch_size: Upper bound on events enqueued per run
+    
+    Returns:
+        dict: Number of events enqueued
+    """
+    from .models import WebhookEvent
+    from .providers import get_providers
+    
+    enqueued = 0
+    for provider in get_providers():
+        event_ids = WebhookEvent.schedule_due(service=provider.name, limit=batch_size - enqueued)
+        provider.enqueue(event_ids)
+        enqueued += len(event_ids)
+        if enqueued >= batch_size:
+            break
+    
+    if enqueued:
+        logger.info(f"Re-enqueued {enqueued} webhook events for retry")
+    return {'enqueued': enqueued}
+
+
+@shared_task(queue='high')
+def flush_webhook_buffer(max_batches: int = 20) -> dict:
+    """
+    Insert buffered webhook deliveries in micro-batches.
+    
+    Each batch is one INSERT ... ON CONFLICT DO NOTHING (see
+    WebhookEvent.ingest); only newly recorded events are queued for
+    processing, grouped by provider (for Stripe, one drain_webhook_events
+    run per flush). Each batch stays in a Redis batch list until its insert
+    commits: a failed insert puts it back into the buffer, and batches
+    abandoned by a killed flush are requeued by the next one.
+    
+    Args:
+        max_batches: Upper bound on batches per run
+    
+    Returns:
+        dict: Counts of flushed and newly recorded events
+    """
+    from collections import defaultdict
+    from django.conf import settings
+    from .buffer import ack_events, requeue_stale, restore_events, take_events
+    from .models import WebhookEvent
+    from .providers import get_provider
+    
+    flushed = 0
+    recorded = 0
+    new_events = defaultdict(list)
+    requeue_stale()
+    for _ in range(max_batches):
+        batch_key, events = take_events(settings.WEBHOOK_BUFFER_BATCH_SIZE)
+        if not events:
+            break
+        try:
+            inserted = WebhookEvent.ingest(events)
+        except Exception:
+            restore_events(batch_key)
+            raise
+        ack_events(batch_key)
+        
+        services = {event['event_id']: event['service'] for event in events}
+        for webhook_event_id, event_id in inserted:
+            new_events[services[event_id]].append(webhook_event_id)
+        flushed += len(events)
+        recorded += len(inserted)
+    
+    for service, webhook_event_ids in new_events.items():
+        provider = get_provider(service)
+        if provider is not None:
+            provider.enqueue_buffered(webhook_event_ids)
+    if flushed:
+        logger.info(f"Flushed {flushed} buffered webhook events ({recorded} new)")
+    return {'flushed': flushed, 'recorded': recorded}
 
 
 @shared_task(queue='high')
@@ -75,7 +441,7 @@ def process_stripe_subscription(
         subscription_id: UUID of local Subscription
         payment_method_id: Stripe payment method ID
         idempotency_key: Idempotency key for Stripe
-        
+    
     Returns:
         dict: Stripe subscription data
     """
@@ -103,24 +469,39 @@ def process_stripe_subscription(
     return {'status': 'created', 'subscription_id': subscription_id}
 
 
-@shared_task
-def cleanup_old_webhook_events() -> dict:
+@shared_task(queue='low')
+def cleanup_old_webhook_events(batch_size: int = 1000, max_batches: int = 500) -> dict:
     """
-    Clean up old webhook events.
-    Run via Celery beat.
+    Delete processed webhook events past the retention window.
+    Run via Celery beat (daily).
+    
+    Events older than WEBHOOK_RETENTION_DAYS are deleted in bounded batches
+    (see WebhookEvent.purge_processed); with WEBHOOK_ARCHIVE_STORAGE set,
+    each batch is archived as compressed NDJSON to that storage first.
+    Unprocessed events are kept regardless of age.
+    
+    Args:
+        batch_size: Rows deleted per statement
+        max_batches: Upper bound on batches per run
     
     Returns:
         dict: Cleanup results
     """
+    import time
     from datetime import timedelta
+    from django.conf import settings
     from .models import WebhookEvent
     
-    # Delete processed events older than 30 days
-    threshold = timezone.now() - timedelta(days=30)
+    threshold = timezone.now() - timedelta(days=settings.WEBHOOK_RETENTION_DAYS)
     
-    deleted, _ = WebhookEvent.objects.filter(
-        status='processed',
-        created_at__lt=threshold
-    ).delete()
+    started = time.monotonic()
+    deleted = WebhookEvent.purge_processed(
+        threshold,
+        batch_size=batch_size,
+        max_batches=max_batches,
+        archive_storage=settings.WEBHOOK_ARCHIVE_STORAGE or None,
+    )
+    duration = time.monotonic() - started
     
-    return {'deleted': deleted}
+    logger.info(f"Deleted {deleted} webhook events older than {threshold:%Y-%m-%d} in {duration:.2f}s")
+    return {'deleted': deleted, 'duration_seconds': round(duration, 3)}
@@ -3,8 +3,9 @@ Webhooks URL Configuration
 """
 from django.urls import path
 
-from .views import StripeWebhookView
+from .views import StripeWebhookView, WebhookIngestView
 
 urlpatterns = [
     path('webhooks/stripe/', StripeWebhookView.as_view(), name='stripe-webhook'),
+    path('webhooks/<str:provider>/', WebhookIngestView.as_view(), name='webhook-ingest'),
 ]
@@ -10,75 +10,80 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .models import WebhookEvent
-from .handlers.stripe import StripeWebhookHandler
+from .providers import get_provider
 
 logger = logging.getLogger(__name__)
 
 
-class StripeWebhookView(APIView):
+class WebhookIngestView(APIView):
     """
-    Stripe webhook endpoint.
+    Webhook endpoint for any registered provider.
     
-    POST /webhooks/stripe/
+    POST /webhooks/<provider>/
     
     Flow:
-    1. Verify signature
-    2. Check for duplicate event
-    3. Create WebhookEvent record
-    4. Enqueue processing task
-    5. Return 200 immediately
+    1. Verify the delivery with the provider's signature scheme
+    2. Record the WebhookEvents unless they are duplicates (one statement),
+       or buffer them for a batched insert when WEBHOOK_INGEST_BUFFER is on
+    3. Enqueue processing with the provider
+    4. Return 200 immediately
     """
     permission_classes = [AllowAny]
     
-    def post(self, request):
-        """Handle incoming Stripe webhook."""
-        payload = request.body
-        sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
-        
-        # Get endpoint secret from settings
-        endpoint_secret = getattr(settings, 'STRIPE_WEBHOOK_SECRET', None)
+    # Fixed provider for provider-specific routes
+    provider_name = None
+    
+    def post(self, request, provider=None):
+        """Handle an incoming webhook delivery."""
+        webhook_provider = get_provider(provider or self.provider_name)
+        if webhook_provider is None:
+            return Response({'error': 'Unknown webhook provider'}, status=status.HTTP_404_NOT_FOUND)
         
-        if not endpoint_secret:
-            logger.error("STRIPE_WEBHOOK_SECRET not configured")
-            # Still return 200 to avoid Stripe retries
+        if not webhook_provider.is_configured():
+            logger.error(f"{webhook_provider.name} webhook secret not configured")
+            # Still return 200 to avoid provider retries
             return Response({'status': 'configuration_error'}, status=status.HTTP_200_OK)
         
         # Verify signature
-        event = StripeWebhookHandler.verify_signature(payload, sig_header, endpoint_secret)
-        if not event:
+        events = webhook_provider.verify(request)
+        if events is None:
             # Return 400 for invalid signature
             return Response(
                 {'error': 'Invalid signature'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        event_id = event.get('id')
-        event_type = event.get('type')
+        records = webhook_provider.records(events, request.body)
+        if not records:
+            return Response({'status': 'accepted'}, status=status.HTTP_200_OK)
         
-        # Check for duplicate (idempotency)
-        existing = WebhookEvent.objects.filter(
-            event_id=event_id,
-            service='stripe'
-        ).first()
+        # Retry storms: buffer in Redis and insert in micro-batches
+        if settings.WEBHOOK_INGEST_BUFFER:
+            from .buffer import buffer_event
+            for record in records:
+                buffer_event(record)
+            return Response({'status': 'accepted'}, status=status.HTTP_200_OK)
         
-        if existing:
-            logger.info(f"Duplicate Stripe event: {event_id}")
+        # Dedupe and record in one statement (idempotency)
+        inserted = WebhookEvent.ingest(records)
+        if not inserted:
+            logger.info(f"Duplicate {webhook_provider.name} delivery: {records[0]['event_id']}")
             # Return 200 for duplicates (don't trigger retries)
             return Response({'status': 'duplicate'}, status=status.HTTP_200_OK)
         
-        # Create WebhookEvent record
-        webhook_event = WebhookEvent.objects.create(
-            service='stripe',
-            event_id=event_id,
-            event_type=event_type,
-            payload=event
-        )
-        
-        logger.info(f"Created WebhookEvent: {webhook_event.id} ({event_type})")
+        logger.info(f"Created {len(inserted)} {webhook_provider.name} WebhookEvent(s)")
         
-        # Enqueue processing task
-        from .tasks import process_stripe_webhook
-        process_stripe_webhook.delay(str(webhook_event.id))
+        # Enqueue processing
+        webhook_provider.enqueue([webhook_event_id for webhook_event_id, _event_id in inserted])
         
         # Return 200 immediately (async processing)
         return Response({'status': 'accepted'}, status=status.HTTP_200_OK)
+
+
+class StripeWebhookView(WebhookIngestView):
+    """
+    Stripe webhook endpoint.
+    
+    POST /webhooks/stripe/
+    """
+    provider_name = 'stripe'
@@ -5,6 +5,7 @@ Task queue with high, default, and low priority queues
 import os
 
 from celery import Celery
+from celery.schedules import crontab
 from kombu import Queue
 
 # Set the default Django settings module for the 'celery' program.
@@ -74,6 +75,47 @@ app.conf.result_expires = 3600  # 1 hour
 # =============================================================================
 app.conf.beat_scheduler = 'django_celery_beat.schedulers:DatabaseScheduler'
 
+# Default schedule; DatabaseScheduler syncs these entries into
+# django_celery_beat at startup, where they can be edited in the admin.
+app.conf.beat_schedule = {
+    # Overdue reminders; also refreshes the overdue totals on
+    # OrganizationBillingSummary
+    'check-overdue-invoices': {
+        'task': 'apps.billing.tasks.check_overdue_invoices',
+        'schedule': crontab(hour=9, minute=0),
+        'options': {'queue': 'low'},
+    },
+    'cleanup-expired-idempotency-records': {
+        'task': 'apps.billing.tasks.cleanup_expired_idempotency_records',
+        'schedule': crontab(minute=15),
+        'options': {'queue': 'low'},
+    },
+    # Safety net for the webhook ingest buffer (flushes are normally
+    # scheduled by the ingest path itself)
+    'flush-webhook-buffer': {
+        'task': 'apps.webhooks.tasks.flush_webhook_buffer',
+        'schedule': 30.0,
+        'options': {'queue': 'high'},
+    },
+    'retry-failed-webhook-events': {
+        'task': 'apps.webhooks.tasks.retry_failed_webhook_events',
+        'schedule': 60.0,
+        'options': {'queue': 'high'},
+    },
+    'cleanup-old-webhook-events': {
+        'task': 'apps.webhooks.tasks.cleanup_old_webhook_events',
+        'schedule': crontab(hour=3, minute=30),
+        'options': {'queue': 'low'},
+    },
+    # Batch processing of pending webhook events (including ones whose
+    # per-event task gave up or was never queued)
+    'drain-webhook-events': {
+        'task': 'apps.webhooks.tasks.drain_webhook_events',
+        'schedule': 60.0,
+        'options': {'queue': 'high'},
+    },
+}
+
 
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
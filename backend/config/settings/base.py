@@ -132,6 +132,13 @@ DATABASES = {
         },
     }
 }
+# Same database on a separate connection, for invoice number blocks that
+# must commit outside the caller's transaction (INVOICE_NUMBER_BLOCK_SIZE > 1).
+# A regular alias, so Django closes it like any other connection.
+DATABASES['sequences'] = {
+    **DATABASES['default'],
+    'TEST': {'MIRROR': 'default'},
+}
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -172,6 +179,27 @@ STATICFILES_DIRS = [BASE_DIR / 'static'] if (BASE_DIR / 'static').exists() else
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# =============================================================================
+# FILE STORAGE
+# =============================================================================
+# Invoice PDFs and DSAR exports default to local storage under MEDIA_ROOT;
+# set INVOICE_STORAGE_BACKEND / EXPORT_STORAGE_BACKEND to
+# storages.backends.s3.S3Storage to use S3.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'invoices': {
+        'BACKEND': get_env('INVOICE_STORAGE_BACKEND', 'django.core.files.storage.FileSystemStorage'),
+    },
+    'exports': {
+        'BACKEND': get_env('EXPORT_STORAGE_BACKEND', 'django.core.files.storage.FileSystemStorage'),
+    },
+}
+
 # =============================================================================
 # AWS S3 CONFIGURATION (Singapore Region for PDPA)
 # =============================================================================
@@ -184,6 +212,23 @@ AWS_S3_OBJECT_PARAMETERS = {'CacheControl': 'max-age=86400'}
 AWS_QUERYSTRING_AUTH = True
 AWS_S3_FILE_OVERWRITE = False
 
+# Uploads: multipart with concurrent parts above the threshold, sharing one
+# pooled client per worker thread (see apps.core.storage.upload_file)
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotocoreConfig
+AWS_S3_MULTIPART_THRESHOLD = get_env('AWS_S3_MULTIPART_THRESHOLD', str(8 * 1024 * 1024), cast=int)
+AWS_S3_MAX_CONCURRENCY = get_env('AWS_S3_MAX_CONCURRENCY', '8', cast=int)
+AWS_S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=AWS_S3_MULTIPART_THRESHOLD,
+    multipart_chunksize=AWS_S3_MULTIPART_THRESHOLD,
+    max_concurrency=AWS_S3_MAX_CONCURRENCY,
+    use_threads=True,
+)
+AWS_S3_CLIENT_CONFIG = BotocoreConfig(
+    max_pool_connections=AWS_S3_MAX_CONCURRENCY * 2,
+    retries={'max_attempts': 5, 'mode': 'standard'},
+)
+
 # =============================================================================
 # REST FRAMEWORK
 # =============================================================================
@@ -261,10 +306,11 @@ CELERY_RESULT_SERIALIZER = 'json'
 # =============================================================================
 # REDIS CACHE
 # =============================================================================
+REDIS_URL = get_env('REDIS_URL', 'redis://localhost:6379/0')
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-        'LOCATION': get_env('REDIS_URL', 'redis://localhost:6379/0'),
+        'LOCATION': REDIS_URL,
     }
 }
 
@@ -278,6 +324,8 @@ EMAIL_USE_TLS = get_env('EMAIL_USE_TLS', 'False', cast=bool)
 EMAIL_HOST_USER = get_env('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = get_env('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = get_env('DEFAULT_FROM_EMAIL', 'noreply@nexuscore.sg')
+# Base64 verification key from SendGrid's Signed Event Webhook settings
+SENDGRID_WEBHOOK_PUBLIC_KEY = get_env('SENDGRID_WEBHOOK_PUBLIC_KEY', '')
 
 # =============================================================================
 # CONTENT SECURITY POLICY (django-csp 4.0 format)
@@ -307,8 +355,51 @@ SECURE_CONTENT_TYPE_NOSNIFF = True
 STRIPE_PUBLIC_KEY = get_env('STRIPE_PUBLIC_KEY', '')
 STRIPE_SECRET_KEY = get_env('STRIPE_SECRET_KEY', '')
 STRIPE_WEBHOOK_SECRET = get_env('STRIPE_WEBHOOK_SECRET', '')
+# Max age in seconds of a signed webhook timestamp (Stripe's default)
+STRIPE_WEBHOOK_TOLERANCE = get_env('STRIPE_WEBHOOK_TOLERANCE', '300', cast=int)
 STRIPE_API_VERSION = get_env('STRIPE_API_VERSION', '2024-12-18.acacia')
 
+# =============================================================================
+# WEBHOOKS
+# =============================================================================
+# Buffer verified webhook deliveries in Redis and insert them in
+# micro-batches (for retry storms); off = one INSERT per delivery
+WEBHOOK_INGEST_BUFFER = get_env('WEBHOOK_INGEST_BUFFER', 'False', cast=bool)
+WEBHOOK_BUFFER_BATCH_SIZE = get_env('WEBHOOK_BUFFER_BATCH_SIZE', '500', cast=int)
+# Seconds a buffered event may wait before a flush is forced
+WEBHOOK_BUFFER_FLUSH_INTERVAL = get_env('WEBHOOK_BUFFER_FLUSH_INTERVAL', '1', cast=int)
+# Store webhook payloads gzip-compressed (bytea) instead of as JSONB;
+# handlers only read the projection columns extracted at ingest
+WEBHOOK_COMPACT_PAYLOADS = get_env('WEBHOOK_COMPACT_PAYLOADS', 'True', cast=bool)
+# Failed events are retried with jittered exponential backoff (seconds),
+# then dead-lettered after WEBHOOK_MAX_ATTEMPTS attempts
+WEBHOOK_MAX_ATTEMPTS = get_env('WEBHOOK_MAX_ATTEMPTS', '5', cast=int)
+WEBHOOK_RETRY_BASE_DELAY = get_env('WEBHOOK_RETRY_BASE_DELAY', '60', cast=int)
+WEBHOOK_RETRY_MAX_DELAY = get_env('WEBHOOK_RETRY_MAX_DELAY', '3600', cast=int)
+# Processed events are deleted after this many days; set an archive
+# STORAGES alias (e.g. 'exports') to keep them as compressed NDJSON first
+WEBHOOK_RETENTION_DAYS = get_env('WEBHOOK_RETENTION_DAYS', '30', cast=int)
+WEBHOOK_ARCHIVE_STORAGE = get_env('WEBHOOK_ARCHIVE_STORAGE', '')
+
+# =============================================================================
+# AUDIT EVENT LOG
+# =============================================================================
+# How Event.log writes after commit: 'buffer' (batched bulk_create per
+# process), 'celery' (batches handed to a low-queue task) or 'sync'
+EVENT_LOG_MODE = get_env('EVENT_LOG_MODE', 'buffer')
+EVENT_LOG_BATCH_SIZE = get_env('EVENT_LOG_BATCH_SIZE', '100', cast=int)
+EVENT_LOG_FLUSH_INTERVAL_MS = get_env('EVENT_LOG_FLUSH_INTERVAL_MS', '1000', cast=int)
+
+# =============================================================================
+# METRICS
+# =============================================================================
+# Histograms and counters aggregated in Redis and served at /metrics
+# (Prometheus format); also recorded via the OpenTelemetry API
+METRICS_ENABLED = get_env('METRICS_ENABLED', 'True', cast=bool)
+# Bearer token required to scrape /metrics (empty = endpoint disabled
+# unless DEBUG is on)
+METRICS_TOKEN = get_env('METRICS_TOKEN', '')
+
 # =============================================================================
 # SENTRY CONFIGURATION
 # =============================================================================
@@ -328,6 +419,36 @@ from decimal import Decimal
 GST_RATE = Decimal(get_env('GST_RATE', '0.0900'))
 GST_REGISTRATION_THRESHOLD = get_env('GST_REGISTRATION_THRESHOLD', '1000000', cast=int)
 
+# =============================================================================
+# BILLING
+# =============================================================================
+# Invoice numbers reserved per worker at a time (1 = gapless numbering)
+INVOICE_NUMBER_BLOCK_SIZE = get_env('INVOICE_NUMBER_BLOCK_SIZE', '1', cast=int)
+# Minimum days between overdue reminders for the same invoice
+INVOICE_OVERDUE_REMINDER_INTERVAL_DAYS = get_env('INVOICE_OVERDUE_REMINDER_INTERVAL_DAYS', '7', cast=int)
+# Seconds a queued PDF render holds the per-invoice lock
+INVOICE_PDF_LOCK_TIMEOUT = get_env('INVOICE_PDF_LOCK_TIMEOUT', '300', cast=int)
+# TrueType (.ttf) font embedded in invoice PDFs, for names outside Latin-1
+# (e.g. Chinese, Tamil); empty = built-in Courier, which rejects such text.
+# Use a monospaced font so the template's columns line up.
+INVOICE_PDF_FONT = get_env('INVOICE_PDF_FONT', '')
+# Days after a quarter ends before its GST F5 totals are final and cached
+GST_F5_FINALIZE_DAYS = get_env('GST_F5_FINALIZE_DAYS', '30', cast=int)
+
+# =============================================================================
+# IDEMPOTENCY
+# =============================================================================
+# Stored replay bodies: compression (gzip, zstd or none), the size above
+# which bodies are compressed, and the cap above which only a reference to
+# the created resource is kept
+IDEMPOTENCY_RESPONSE_COMPRESSION = get_env('IDEMPOTENCY_RESPONSE_COMPRESSION', 'gzip')
+IDEMPOTENCY_RESPONSE_COMPRESS_MIN_BYTES = get_env('IDEMPOTENCY_RESPONSE_COMPRESS_MIN_BYTES', '1024', cast=int)
+IDEMPOTENCY_RESPONSE_MAX_BYTES = get_env('IDEMPOTENCY_RESPONSE_MAX_BYTES', '262144', cast=int)
+# How long a key stays held by a request in progress before a retry may
+# take it over (a few times the request timeout); completed responses are
+# kept for IDEMPOTENCY_EXPIRY_HOURS
+IDEMPOTENCY_PROCESSING_LEASE_SECONDS = get_env('IDEMPOTENCY_PROCESSING_LEASE_SECONDS', '300', cast=int)
+
 # =============================================================================
 # LOGGING
 # =============================================================================
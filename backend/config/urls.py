@@ -7,6 +7,8 @@ from django.contrib import admin
 from django.http import JsonResponse
 from django.urls import include, path
 
+from apps.core.metrics import metrics_view
+
 
 def health_check(request):
     """Health check endpoint for container orchestration."""
@@ -24,6 +26,9 @@ urlpatterns = [
     # Health Check
     path('health/', health_check, name='health_check'),
     
+    # Prometheus metrics
+    path('metrics', metrics_view, name='metrics'),
+    
     # API v1
     path('api/v1/', include('apps.users.urls')),
     path('api/v1/', include('apps.organizations.urls')),
@@ -36,8 +41,11 @@ urlpatterns = [
     path('', include('apps.webhooks.urls')),
 ]
 
-# Debug toolbar URLs (only in development)
+# Debug toolbar URLs and local media (only in development)
 if settings.DEBUG:
+    from django.conf.urls.static import static
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    
     try:
         import debug_toolbar
         urlpatterns = [